@@ -0,0 +1,222 @@
+"""Synthetic DOC reports, archives and trends for benchmarking
+
+Nothing here touches doc.wi.gov. Reports are stand-in files naming their
+publication date, and "extracting" tables from one returns pre-built frames
+laid out like a real report from that date's era. Yearly archives and
+current-year reports are written to a local directory and served over HTTP
+by a stand-in for the DOC website, so downloads go through the same code
+paths as a real run.
+"""
+
+import contextlib
+import functools
+import http.server
+import os
+import re
+import sys
+import threading
+import types
+import zipfile
+
+from datetime import datetime
+
+import numpy
+
+from population import (FIELDS, PopulationData)
+
+# first year of published reports
+FIRST_YEAR = 2008
+
+# facilities in the juvenile table, and the years they were open
+FACILITIES = {
+    "Copper Lake School": (2011, None),
+    "Ethan Allen School": (None, 2011),
+    "Grow Academy": (2017, None),
+    "Lincoln Hills School": (None, None),
+    "Mendota Juvenile Treatment Center": (None, None),
+    "Southern Oaks Girls School": (None, 2011),
+}
+
+# pattern matching the contents of a synthetic report
+REPORT_PATTERN = re.compile(rb"^%PDF-synthetic (\d{4}-\d{2}-\d{2})")
+
+
+# -- synthetic reports --------------------------------------------------------
+
+def report_bytes(date):
+    """Return the contents of the synthetic report published on a date"""
+    return f"%PDF-synthetic {date:%Y-%m-%d}\n".encode()
+
+
+def _format(value):
+    return f"{value:,}"
+
+
+def report_tables(date):
+    """Return the tables extracted from the synthetic report for a date
+
+    Tables are laid out as in real reports, including a table the parsers
+    do not use, with figures that vary from week to week. Frames are shared
+    between reports with the same figures, so treat them as read-only.
+    """
+    facilities = tuple(
+        name for (name, (opened, closed)) in FACILITIES.items()
+        if (opened is None or date.year >= opened)
+        and (closed is None or date.year < closed)
+    )
+    return _build_tables((date.toordinal() // 7) % 97, facilities)
+
+
+@functools.lru_cache(maxsize=None)
+def _build_tables(noise, facilities):
+    import pandas
+    youths = [20 + (noise + 11 * i) % 80 for i in range(len(facilities))]
+    return [
+        pandas.DataFrame({
+            "PROBATION/PAROLE": ["ADULTS", "JUVENILES", "FIELD YOUTH"],
+            _format(64000 + noise): ["63,000", "900", str(300 + noise)],
+        }),
+        pandas.DataFrame({
+            "ADULT INSTITUTIONS": [
+                "MAXIMUM SECURITY",
+                "MEDIUM SECURITY",
+                "MINIMUM SECURITY",
+                "SUBTOTAL-MALES",
+            ],
+            "17,000": ["5,000", "6,000", "3,000", "15,000"],
+            _format(20000 + noise): [
+                _format(6000 + noise),
+                "8,000",
+                "3,500",
+                _format(17500 + noise),
+            ],
+        }),
+        pandas.DataFrame({
+            "CONTRACT BEDS": ["COUNTY JAILS", "OTHER"],
+            "100": ["50", "50"],
+        }),
+        pandas.DataFrame({
+            "FEMALES - ALL INSTITUTIONS": ["MINIMUM SECURITY", "OTHER"],
+            "1,000": ["500", "500"],
+            _format(1200 + noise): [str(600 + noise), "600"],
+        }),
+        pandas.DataFrame({
+            "JUVENILE FACILITIES": list(facilities) + ["Total"],
+            "TYPE": [""] * (len(facilities) + 1),
+            "CAPACITY": ["150"] * len(facilities) + [
+                str(150 * len(facilities)),
+            ],
+            "COUNT": [str(n) for n in youths] + [str(sum(youths))],
+        }),
+    ]
+
+
+def _read_pdf(pdf, **kwargs):
+    """Stand-in for `tabula.read_pdf`, reading synthetic reports only"""
+    content = pdf.read()
+    date = datetime.strptime(
+        REPORT_PATTERN.match(content).group(1).decode(),
+        "%Y-%m-%d",
+    )
+    return report_tables(date)
+
+
+@contextlib.contextmanager
+def synthetic_extraction():
+    """Extract tables from synthetic reports, in place of tabula
+
+    This replaces the ``tabula`` module for the duration of the context, so
+    table extraction costs nothing and needs no JVM, and the benchmarks time
+    everything around it.
+    """
+    saved = sys.modules.get("tabula")
+    sys.modules["tabula"] = types.SimpleNamespace(read_pdf=_read_pdf)
+    try:
+        yield
+    finally:
+        if saved is None:
+            sys.modules.pop("tabula", None)
+        else:
+            sys.modules["tabula"] = saved
+
+
+# -- synthetic website --------------------------------------------------------
+
+def _fridays(year):
+    first = datetime(year, 1, 1).toordinal()
+    first += (4 - datetime.fromordinal(first).weekday()) % 7
+    return [
+        datetime.fromordinal(ordinal)
+        for ordinal in range(first, datetime(year + 1, 1, 1).toordinal(), 7)
+    ]
+
+
+def write_archive(path, year):
+    """Write a yearly archive of synthetic reports, laid out as DOC's are"""
+    fmt = "%Y.%m.%d" if year < 2016 else "%m%d%Y"
+    with zipfile.ZipFile(path, "w") as archive:
+        for date in _fridays(year):
+            archive.writestr(
+                f"Archive {year}/{date.strftime(fmt)}.pdf",
+                report_bytes(date),
+            )
+
+
+def write_site(root, last):
+    """Write a synthetic DOC website under ``root``
+
+    Archives are written to ``root/archives/`` for every year from
+    `FIRST_YEAR` up to, but not including, ``last``, and weekly reports
+    for the year ``last`` to ``root/reports/``.
+    """
+    os.makedirs(os.path.join(root, "archives"), exist_ok=True)
+    os.makedirs(os.path.join(root, "reports"), exist_ok=True)
+    for year in range(FIRST_YEAR, last):
+        write_archive(os.path.join(root, "archives", f"{year}.zip"), year)
+    for date in _fridays(last):
+        with open(os.path.join(
+            root,
+            "reports",
+            f"{date.strftime('%m%d%Y')}.pdf",
+        ), "wb") as report:
+            report.write(report_bytes(date))
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve(root):
+    """Serve a directory over HTTP on localhost, and yield its base URL"""
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        functools.partial(_QuietHandler, directory=root),
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# -- synthetic trends ---------------------------------------------------------
+
+def synthetic_trends(length, seed=0):
+    """Return ``length`` weeks of plausible population figures
+
+    Counts follow a random walk, and Ethan Allen closes partway through,
+    as the youth figure expects.
+    """
+    rng = numpy.random.default_rng(seed)
+    first = numpy.datetime64(_fridays(FIRST_YEAR)[0], "D")
+    data = PopulationData(first + 7 * numpy.arange(length))
+    for field in FIELDS:
+        start = 50. if field.endswith("_percentage") else 1000.
+        walk = start + numpy.cumsum(rng.normal(0, start / 100, length))
+        data[field][:] = numpy.abs(walk)
+    data["ethan_allen_count"][length // 5:] = 0
+    return data
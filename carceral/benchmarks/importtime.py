@@ -0,0 +1,85 @@
+"""Check that the carceral command-line entry points start up quickly
+
+Each entry point is imported in a fresh interpreter under
+``python -X importtime``, and its cumulative import time is compared to a
+startup budget. Exits with a non-zero status if any entry point is over.
+
+To use, from the ``carceral`` directory:
+
+    $ python -m benchmarks.importtime
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# directory holding the entry points
+CARCERAL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# entry points, and their startup budget in seconds
+ENTRY_POINTS = {
+    "get_doc_trends": 0.5,
+    "unpack_doc_trends": 0.5,
+    "trend_with_rate": 0.5,
+}
+
+
+def measure_import_time(module):
+    """Return the cumulative time to import a module, in seconds"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=CARCERAL_DIR,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    # lines read "import time: <self> | <cumulative> | <name>", in us
+    for line in proc.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1e6
+    raise RuntimeError(f"no import time reported for {module}")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "modules",
+        nargs="*",
+        default=list(ENTRY_POINTS),
+        help="entry points to check, default: all",
+    )
+    parser.add_argument(
+        "-b",
+        "--budget",
+        type=float,
+        default=None,
+        help="startup budget in seconds, overriding the per-module defaults",
+    )
+    parser.add_argument(
+        "-n",
+        "--repeat",
+        type=int,
+        default=5,
+        help="number of runs per module, the fastest is kept, default: 5",
+    )
+    args = parser.parse_args(args)
+
+    failed = []
+    for module in args.modules:
+        budget = args.budget or ENTRY_POINTS.get(module, 0.5)
+        elapsed = min(
+            measure_import_time(module)
+            for _ in range(args.repeat)
+        )
+        status = "ok" if elapsed <= budget else "OVER BUDGET"
+        print(f"{module:<20} {elapsed:7.3f} s  (budget {budget:.3f} s)  "
+              f"{status}")
+        if elapsed > budget:
+            failed.append(module)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
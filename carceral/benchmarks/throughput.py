@@ -0,0 +1,327 @@
+"""Measure throughput of the DOC scrape and plotting stages
+
+Each benchmark runs against synthetic fixtures (see `benchmarks.fixtures`),
+at multiples of the current history length: the number of weekly reports
+published since 2008. Nothing is downloaded from doc.wi.gov; yearly
+archives and current-year reports are served from a local stand-in site,
+and table extraction returns pre-built frames rather than running tabula.
+
+To use, from the ``carceral`` directory:
+
+    $ python -m benchmarks.throughput  # everything, at 1x, 10x and 100x
+    $ python -m benchmarks.throughput parse render --scale 1 10
+
+To catch regressions, save results from a known-good run with ``--output``,
+then pass them to later runs with ``--compare``, which exits with a
+non-zero status if any rate drops by more than ``--tolerance``.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+
+from benchmarks.fixtures import (
+    FIRST_YEAR,
+    report_tables,
+    serve,
+    synthetic_extraction,
+    synthetic_trends,
+    write_site,
+)
+
+# multiples of the current history length to benchmark at
+SCALES = (1, 10, 100)
+
+# largest drop in rate, relative to a baseline, not counted as a regression
+TOLERANCE = 0.2
+
+# is it now?
+NOW = datetime.now()
+
+# number of years of reports published so far, including this one
+HISTORY_YEARS = NOW.year - FIRST_YEAR + 1
+
+
+# -- utilities ----------------------------------------------------------------
+
+@contextlib.contextmanager
+def _patched(module, **attrs):
+    """Temporarily set attributes of a module"""
+    saved = {name: getattr(module, name) for name in attrs}
+    for (name, value) in attrs.items():
+        setattr(module, name, value)
+    try:
+        yield module
+    finally:
+        for (name, value) in saved.items():
+            setattr(module, name, value)
+
+
+@contextlib.contextmanager
+def _workdir():
+    """Run in a fresh temporary directory"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        try:
+            yield tmpdir
+        finally:
+            os.chdir(cwd)
+
+
+def _history(scale):
+    """Return the publication dates of ``scale`` times the real history"""
+    from get_doc_trends import get_publication_dates
+    dates = get_publication_dates(FIRST_YEAR)
+    return [
+        datetime.fromordinal(dates[0].toordinal() + 7 * i)
+        for i in range(len(dates) * scale)
+    ]
+
+
+def _result(name, scale, count, unit, seconds, **extra):
+    result = {
+        "benchmark": name,
+        "scale": scale,
+        "count": count,
+        "unit": unit,
+        "seconds": seconds,
+        "rate": count / seconds if seconds else float("inf"),
+    }
+    result.update(extra)
+    print(f"{name:<28} {scale:>4}x {count:>8} {unit:<8} "
+          f"{seconds:9.3f} s {result['rate']:12.1f} {unit}/s")
+    return result
+
+
+# -- benchmarks ---------------------------------------------------------------
+
+def bench_parse(scale, **kwargs):
+    """Index and parse extracted tables, as for one report per week"""
+    import get_doc_trends as g
+    dates = _history(scale)
+    # build (or fetch cached) frames up front, so only parsing is timed
+    frames = [report_tables(date) for date in dates]
+    profile = g.EXTRACTION_PROFILE
+    start = time.perf_counter()
+    for data in frames:
+        tables = {
+            role: g.TableIndex(frame, profile["columns"].get(role))
+            for (role, frame) in g._classify_tables(data, profile).items()
+        }
+        record = {}
+        g.parse_totals(tables, record)
+        g.parse_incarcerated_males(tables, record)
+        g.parse_incarcerated_females(tables, record)
+        g.parse_facility_youths(tables, record)
+    return [_result(
+        "parse", scale, len(dates), "reports",
+        time.perf_counter() - start,
+    )]
+
+
+def bench_download_archive(scale, **kwargs):
+    """Download every yearly archive from a local stand-in site"""
+    import get_doc_trends as g
+    years = HISTORY_YEARS * scale
+    last = FIRST_YEAR + years - 1
+    with _workdir() as tmpdir:
+        site = os.path.join(tmpdir, "site")
+        write_site(site, last)
+        with serve(site) as url, _patched(
+            g,
+            ARCHIVE_URL=f"{url}/archives",
+            SESSION=None,
+        ):
+            start = time.perf_counter()
+            for year in range(FIRST_YEAR, last):
+                g._download_archive(str(year))
+            seconds = time.perf_counter() - start
+        size = sum(
+            os.path.getsize(os.path.join(g.ARCHIVE_DIR, name))
+            for name in os.listdir(g.ARCHIVE_DIR)
+        )
+    return [_result(
+        "download_archive", scale, years - 1, "archives", seconds,
+        megabytes=size / 2 ** 20,
+    )]
+
+
+def bench_get_trends(scale, workers=1, **kwargs):
+    """Run the whole scrape from an empty cache, then again with no change
+
+    The per-stage breakdown of each run is included in its results.
+    """
+    import get_doc_trends as g
+    from metrics import RunMetrics
+    years = HISTORY_YEARS * scale
+    last = FIRST_YEAR + years - 1
+    results = []
+    with _workdir() as tmpdir:
+        site = os.path.join(tmpdir, "site")
+        write_site(site, last)
+        with serve(site) as url, synthetic_extraction(), _patched(
+            g,
+            ARCHIVE_URL=f"{url}/archives",
+            SOURCE_URL=f"{url}/reports",
+            NOW=datetime(last, NOW.month, min(NOW.day, 28)),
+            ARCHIVE_INDEX={},
+            SESSION=None,
+        ):
+            for name in ("get_trends (cold)", "get_trends (warm)"):
+                g.METRICS = RunMetrics()
+                start = time.perf_counter()
+                trends = g.get_trends(workers=workers)
+                seconds = time.perf_counter() - start
+                g.ARCHIVE_INDEX.clear()
+                results.append(_result(
+                    name, scale, len(trends), "reports", seconds,
+                    stages=g.METRICS.report()["stages"],
+                ))
+    return results
+
+
+def bench_render(scale, workers=None, **kwargs):
+    """Render each figure in turn, then all of them concurrently"""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    import unpack_doc_trends as u
+    from gwpy.timeseries import TimeSeriesDict
+    data = synthetic_trends(len(_history(scale)))
+    results = []
+    with _workdir():
+        os.makedirs("fig", exist_ok=True)
+        start = time.perf_counter()
+        trends = u._unpack_data(data, list(data.columns))
+        results.append(_result(
+            "unpack", scale, len(data), "weeks",
+            time.perf_counter() - start,
+        ))
+        for (output, (plot, fields)) in u.FIGURES.items():
+            start = time.perf_counter()
+            plot(TimeSeriesDict((field, trends[field]) for field in fields),
+                 output)
+            results.append(_result(
+                f"render {plot.__name__[5:]}", scale, len(data), "weeks",
+                time.perf_counter() - start,
+            ))
+        start = time.perf_counter()
+        u.render_figures(data, workers=workers, force=True)
+        results.append(_result(
+            "render_figures", scale, len(u.FIGURES), "figures",
+            time.perf_counter() - start,
+        ))
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Compare results with a baseline run, and return any regressions
+
+    Each result is matched with the baseline result of the same name and
+    scale, if there is one, and is a regression if its rate is lower by
+    more than ``tolerance`` (as a fraction of the baseline rate).
+    """
+    rates = {
+        (result["benchmark"], result["scale"]): result["rate"]
+        for result in baseline
+    }
+    regressions = []
+    for result in results:
+        key = (result["benchmark"], result["scale"])
+        if key not in rates:
+            continue
+        change = result["rate"] / rates[key] - 1 if rates[key] else 0.
+        regressed = change < -tolerance
+        print(f"{key[0]:<28} {key[1]:>4}x {change:+8.1%} vs. baseline  "
+              f"{'REGRESSED' if regressed else 'ok'}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "download_archive": bench_download_archive,
+    "get_trends": bench_get_trends,
+    "render": bench_render,
+}
+
+
+# -- main block ---------------------------------------------------------------
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        default=list(BENCHMARKS),
+        help=f"benchmarks to run, any of {', '.join(BENCHMARKS)}, "
+             "default: all",
+    )
+    parser.add_argument(
+        "-s",
+        "--scale",
+        type=int,
+        nargs="+",
+        default=list(SCALES),
+        help="multiples of the current history length to run at, "
+             "default: %(default)s",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of processes used to scrape reports and render "
+             "figures, default: 1 for scraping, one per figure for rendering",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="PATH",
+        help="write all results, including per-stage breakdowns, to this "
+             "JSON file",
+    )
+    parser.add_argument(
+        "-c",
+        "--compare",
+        metavar="PATH",
+        help="compare rates with those in a JSON file written by "
+             "--output, and exit with a non-zero status if any regressed",
+    )
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help="largest drop in rate not counted as a regression, as a "
+             "fraction of the baseline, default: %(default)s",
+    )
+    args = parser.parse_args(args)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    if args.compare:  # fail early if the baseline cannot be read
+        with open(args.compare, "r") as saved:
+            baseline = json.load(saved)
+
+    results = []
+    for scale in args.scale:
+        for name in args.benchmarks:
+            kwargs = {} if args.workers is None else {"workers": args.workers}
+            results.extend(BENCHMARKS[name](scale, **kwargs))
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(json.dumps(results, indent=2))
+    if args.compare and compare(results, baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,65 +5,95 @@ which is unforutnately reflected below. Percentages calculated here are
 relative to the state's reported design capacity in each category.
 """
 
+import argparse
+import bisect
+import hashlib
 import json
 import os
-import requests
-import shutil
-import tabula
+import re
+import tempfile
+import threading
+import time
 import tqdm
+import warnings
 import zipfile
 
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor)
 from datetime import (datetime, timedelta)
 from io import BytesIO
 
+from metrics import (RunMetrics, profiled)
+from population import PopulationData
+
 # is it now?
 NOW = datetime.now()
 
-# global data object
-POPULATION_DATA = {
-    # basic summary
-    "publication_date": [],
-    "probation_parole_total": [],
-    "inmate_total": [],
-    "inmate_total_percentage": [],
-    "facility_youth_total": [],
-    "facility_youth_percentage": [],
-    "field_youth_total": [],
-    # incarcerated youth
-    "copper_lake_count": [],
-    "copper_lake_percentage": [],
-    "ethan_allen_count": [],
-    "ethan_allen_percentage": [],
-    "grow_academy_count": [],
-    "grow_academy_percentage": [],
-    "lincoln_hills_count": [],
-    "lincoln_hills_percentage": [],
-    "mendota_count": [],
-    "mendota_percentage": [],
-    "southern_oaks_count": [],
-    "southern_oaks_percentage": [],
-    # incarcerated adult males
-    "male_inmate_count": [],
-    "male_inmate_percentage": [],
-    "male_maximum_security_count": [],
-    "male_maximum_security_percentage": [],
-    "male_medium_security_count": [],
-    "male_medium_security_percentage": [],
-    "male_minimum_security_count": [],
-    "male_minimum_security_percentage": [],
-    # incarcerated adult females
-    "female_inmate_count": [],
-    "female_inmate_percentage": [],
-    "female_minimum_security_count": [],
-    "female_minimum_security_percentage": [],
-}
-
 # data source URLs
 SOURCE_URL = "https://doc.wi.gov/DataResearch/WeeklyPopulationReports"
 ARCHIVE_URL = "https://doc.wi.gov/DataResearch/ArchivedPopulationReports/"
 
-# list of intermediate data folders to clean
-FOLDERS_TO_CLEAN = []
+# on-disk cache of parsed reports, one JSON file per publication date
+CACHE_DIR = ".doc-cache"
+
+# version of the records parsed from each report, stored with each cache
+# entry; bump this whenever a change to extraction or parsing changes what
+# a record holds, so cached reports are parsed again
+PARSER_VERSION = 1
+
+# yearly report archives, kept across runs
+ARCHIVE_DIR = os.path.join(CACHE_DIR, "archives")
+
+# file name formats of weekly reports, before and after 2016
+REPORT_FORMATS = ("%Y.%m.%d", "%m%d%Y")
+
+# which pages to extract tables from (reports are read in full if any table
+# is not found there), the pattern matching the first column header of the
+# table each parser reads (the first table always holds the totals), and
+# the positions of the capacity and count columns in each table; reports
+# from before and after 2016 share one layout
+EXTRACTION_PROFILE = {
+    "pages": 1,
+    "tables": {
+        "adult": r"^ADULT INSTITUTIONS$",
+        "female": r"FEMALES",
+        "juvenile": r"JUVENILE",
+    },
+    "columns": {
+        "adult": {"capacity": 1, "count": 2},
+        "female": {"capacity": 1, "count": 2},
+        "juvenile": {"capacity": 2, "count": 3},
+    },
+}
+
+# warn if more than this fraction of reports had to be read in full
+FALLBACK_WARNING = 0.5
+
+# reports that cannot be parsed, and are treated as never published
+MALFORMED_REPORTS = {datetime(2013, 1, 4)}
+
+# index of reports in each yearly archive, see _get_archive_index
+ARCHIVE_INDEX = {}
+
+# local copies of current-year reports, kept across runs
+REPORT_DIR = os.path.join(CACHE_DIR, "reports")
+
+# HTTP settings: concurrent downloads, (connect, read) timeouts in seconds,
+# and retries with exponential backoff on connection errors or these codes
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = (10, 60)
+FETCH_RETRIES = {
+    "total": 5,
+    "backoff_factor": 0.5,
+    "status_forcelist": (429, 500, 502, 503, 504),
+    "allowed_methods": ("GET", "HEAD"),
+}
+
+# shared HTTP session, see _get_session
+SESSION = None
+SESSION_LOCK = threading.Lock()
+
+# timings and counters for the current run, see get_trends
+METRICS = RunMetrics()
 
 
 # -- utilities ----------------------------------------------------------------
@@ -77,82 +107,446 @@ def _parse_int(qty):
         return qty
 
 
+def _get_session():
+    """Return the HTTP session shared by all downloads in this process
+
+    Connections are kept alive and pooled, with enough room for one
+    connection per fetch worker, and failed requests are retried. The
+    session is created under a lock, so fetch threads starting at the same
+    time all share one.
+    """
+    global SESSION
+    with SESSION_LOCK:
+        if SESSION is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            adapter = HTTPAdapter(
+                pool_maxsize=FETCH_WORKERS,
+                max_retries=Retry(**FETCH_RETRIES),
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            SESSION = session
+    return SESSION
+
+
 def _download_archive(year):
-    response = requests.get(f"{ARCHIVE_URL}/{year}.zip", stream=True)
-    # download and unzip the report archive for the given year
-    with zipfile.ZipFile(
-        BytesIO(response.raw.read()),
-        "r",
-    ) as archive:
-        archive.extractall(".")
-        # for archives after 2016, ensure the
-        # target is simply named for the year
-        (target, ) = tuple(set(
-            [os.path.dirname(filename) for filename in archive.namelist()]
-        ))
-        os.rename(target, year)
+    """Download the report archive for a given year, unless already cached"""
+    path = os.path.join(ARCHIVE_DIR, f"{year}.zip")
+    if os.path.exists(path):
+        METRICS.count("archives_cached")
+        return path
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    # stream to a temporary file in chunks, so memory use does not grow
+    # with the size of the archive, and only keep it once complete
+    with METRICS.stage("download_archive"), tempfile.NamedTemporaryFile(
+        dir=ARCHIVE_DIR,
+        suffix=".part",
+        delete=False,
+    ) as spool:
+        try:
+            with _get_session().get(
+                f"{ARCHIVE_URL}/{year}.zip",
+                stream=True,
+                timeout=FETCH_TIMEOUT,
+            ) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    spool.write(chunk)
+        except BaseException:
+            os.remove(spool.name)
+            raise
+    os.replace(spool.name, path)
+    METRICS.count("archives_downloaded")
+    return path
+
+
+def _download_report(url):
+    """Download a report into `REPORT_DIR`, unless the local copy is current
+
+    The ETag and Last-Modified headers of each download are kept next to the
+    local copy, and sent back as a conditional GET on later runs, so reports
+    that have not changed are not downloaded again. Returns the local path,
+    or `None` if there is no report at ``url``.
+    """
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    path = os.path.join(REPORT_DIR, os.path.basename(url))
+    headers = {}
+    if os.path.exists(path):
+        try:
+            with open(f"{path}.headers", "r") as cached:
+                validators = json.load(cached)
+        except FileNotFoundError:
+            validators = {}
+        if "ETag" in validators:
+            headers["If-None-Match"] = validators["ETag"]
+        if "Last-Modified" in validators:
+            headers["If-Modified-Since"] = validators["Last-Modified"]
+    with _get_session().get(
+        url,
+        headers=headers,
+        stream=True,
+        timeout=FETCH_TIMEOUT,
+    ) as response:
+        if response.status_code == 304:  # not modified
+            METRICS.count("reports_not_modified")
+            return path
+        if response.status_code == 404:  # not (yet) published
+            METRICS.count("reports_not_found")
+            return None
+        response.raise_for_status()
+        with open(f"{path}.part", "wb") as spool:
+            for chunk in response.iter_content(chunk_size=1 << 16):
+                spool.write(chunk)
+        validators = {
+            key: response.headers[key]
+            for key in ("ETag", "Last-Modified")
+            if key in response.headers
+        }
+    os.replace(f"{path}.part", path)
+    with open(f"{path}.headers", "w") as cached:
+        json.dump(validators, cached)
+    METRICS.count("reports_downloaded")
+    return path
+
+
+def _fetch_report(url):
+    """Download the report for the week ending on the date named in ``url``
+
+    Reports usually come out on Fridays, but earlier in the week around
+    federal holidays (with file names to match), so if there is no report
+    at ``url``, earlier weekdays of the same week are tried in turn. Returns
+    the local path of the first report found, or `None` if none of them
+    have been published (yet).
+    """
+    (base, date) = (url.rsplit("/", 1)[0], _parse_report_date(url))
+    for days in range(7):
+        candidate = date - timedelta(days=days)
+        if candidate.weekday() >= 5:  # not published at weekends
+            continue
+        name = candidate.strftime(_get_report_era(candidate))
+        path = _download_report(f"{base}/{name}.pdf")
+        if path is not None:
+            return path
+    return None
+
+
+def _fetch_reports(sources, workers=FETCH_WORKERS):
+    """Download web-hosted reports concurrently, and return local sources
+
+    Reports that have not been published are returned as `None`.
+    """
+    def fetch(url):
+        start = time.perf_counter()
+        path = _fetch_report(url)
+        METRICS.observe("fetch_report", time.perf_counter() - start)
+        return path
+
+    urls = [source for source in sources if isinstance(source, str)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        paths = dict(zip(urls, tqdm.tqdm(
+            executor.map(fetch, urls),
+            total=len(urls),
+            desc="Fetching records",
+        )))
+    return [
+        paths[source] if isinstance(source, str) else source
+        for source in sources
+    ]
+
+
+def _get_report_era(date):
+    """Return the file name format used by reports published on a date"""
+    return REPORT_FORMATS[date >= datetime(2016, 1, 1)]
+
+
+def _parse_report_date(name):
+    """Parse the publication date from a report's file name, if possible"""
+    (base, ext) = os.path.splitext(os.path.basename(name))
+    if ext.lower() != ".pdf":
+        return None
+    for fmt in REPORT_FORMATS:
+        try:
+            return datetime.strptime(base, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _get_archive_index(year):
+    """Index the reports in the archive for a given year
+
+    Returns the archive path, a sorted list of publication dates, and a
+    dict mapping each of those dates to its archive member.
+    """
+    if year not in ARCHIVE_INDEX:
+        path = _download_archive(year)
+        with zipfile.ZipFile(path, "r") as archive:
+            # archives before and after 2016 use different top-level
+            # folder names, so go by file name only
+            members = {
+                _parse_report_date(name): name
+                for name in archive.namelist()
+            }
+        members.pop(None, None)
+        for date in MALFORMED_REPORTS:
+            members.pop(date, None)
+        ARCHIVE_INDEX[year] = (path, sorted(members), members)
+    return ARCHIVE_INDEX[year]
 
 
 def _get_published_data_from_date(date):
-    year = str(date.year)
-    base = (
-        date.strftime("%Y.%m.%d")
-        if date < datetime(2016, 1, 1)
-        else date.strftime("%m%d%Y")
-    )
-    source = (
-        os.path.join(year, f"{base}.pdf")
-        if date < datetime(NOW.year, 1, 1)
-        else f"{SOURCE_URL}/{base}.pdf"
+    """Find the source of the report published in the week ending on a date
+
+    Reports usually come out on Fridays, but earlier in the week around
+    federal holidays, so this returns the latest report published at most
+    six days before ``date``, or `None` if there is no such report.
+    """
+    if date >= datetime(NOW.year, 1, 1):
+        base = date.strftime(_get_report_era(date))
+        return f"{SOURCE_URL}/{base}.pdf"
+    # reports from past years are read straight from the yearly archive
+    for year in dict.fromkeys([date.year, (date - timedelta(days=6)).year]):
+        (path, dates, members) = _get_archive_index(str(year))
+        idx = bisect.bisect_right(dates, date)
+        if idx and (date - dates[idx - 1]) < timedelta(days=7):
+            return (path, members[dates[idx - 1]])
+    return None
+
+
+def _read_source(source):
+    """Read the raw bytes of a local PDF report
+
+    Archived reports are given as an ``(archive, member)`` pair.
+    """
+    if isinstance(source, tuple):
+        (path, member) = source
+        with zipfile.ZipFile(path, "r") as archive:
+            return archive.read(member)
+    with open(source, "rb") as pdf:
+        return pdf.read()
+
+
+def _get_cache_path(date):
+    return os.path.join(CACHE_DIR, f"{date.strftime('%Y-%m-%d')}.json")
+
+
+def _load_cached_report(date):
+    """Load the cached entry for a publication date, if there is one
+
+    Entries written by another `PARSER_VERSION` are ignored, so the report
+    is parsed again.
+    """
+    try:
+        with open(_get_cache_path(date), "r") as cached:
+            entry = json.load(cached)
+    except FileNotFoundError:
+        return None
+    if entry.get("version") != PARSER_VERSION:
+        return None
+    return entry
+
+
+def _cache_report(date, digest, record):
+    """Store a report's parsed record, keyed by its date, PDF hash and
+    `PARSER_VERSION`
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _get_cache_path(date)
+    entry = {"version": PARSER_VERSION, "sha256": digest, "record": record}
+    # write then rename, so an interrupted run never leaves a partial entry
+    with open(f"{path}.tmp", "w") as cached:
+        json.dump(entry, cached)
+    os.replace(f"{path}.tmp", path)
+    return entry
+
+
+def _normalize_label(label):
+    return " ".join(label.upper().split())
+
+
+class TableIndex(object):
+    """Read-only view of an extracted table, indexed by row label
+
+    The frame is read once, into plain lists, and every string in its first
+    column is mapped to the first row it labels, so each lookup is a dict
+    hit rather than a scan. Labels not found are recorded in `missing`.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        table extracted from a report, with row labels in the first column
+
+    roles : `dict`, optional
+        position of each named column (e.g. ``"capacity"`` or ``"count"``)
+    """
+    def __init__(self, frame, roles=None):
+        self.header = [str(key) for key in frame.keys()]
+        self.columns = [frame[key].tolist() for key in frame.keys()]
+        self.roles = dict(roles or {})
+        self.rows = {}
+        for (i, label) in enumerate(self.columns[0] if self.columns else []):
+            if isinstance(label, str):
+                self.rows.setdefault(_normalize_label(label), i)
+        self.missing = []
+
+    def find(self, search):
+        """Return the first row whose label contains ``search``, or `None`
+        """
+        key = _normalize_label(search)
+        if key not in self.rows:
+            # some reports label rows with extra words, e.g. "School"
+            self.rows[key] = next(
+                (i for (label, i) in self.rows.items()
+                 if i is not None and key in label),
+                None,
+            )
+        return self.rows[key]
+
+    def value(self, role, row):
+        """Return the number in a named column of the given row"""
+        return _parse_int(self.columns[self.roles[role]][row])
+
+    def total(self, role):
+        """Return the number in the header of a named column"""
+        return _parse_int(self.header[self.roles[role]])
+
+
+def _attempt_search_with_fallback(table, search, record, target=None):
+    target = target or search.lower().replace(" ", "_")
+    idx = table.find(search)
+    if idx is None:  # entry was not found
+        table.missing.append(search)
+        record[f"{target}_count"] = 0
+        record[f"{target}_percentage"] = 0
+        return
+    record[f"{target}_count"] = table.value("count", idx)
+    record[f"{target}_percentage"] = (
+        100 * table.value("count", idx) / table.value("capacity", idx)
     )
-    # retrieve PDF archive if needed
-    if not source.startswith(SOURCE_URL) and not os.path.exists(year):
-        _download_archive(year)
-        FOLDERS_TO_CLEAN.append(year)
-    # handle special case for federal holidays
-    if not source.startswith(SOURCE_URL) and not os.path.exists(source):
-        return _get_published_data_from_date(date - timedelta(days=1))
-    return source
 
 
-def _get_row_index(frame, search):
-    return [
-        i for (i, item) in enumerate(frame[frame.keys()[0]])
-        if isinstance(item, str) and (search in item)
-    ][0]
+def _start_session():
+    """Check that tabula can reuse one JVM for every report in this process
 
-
-def _attempt_search_with_fallback(frame, col, search, target=None):
-    count = frame.keys()[col]
-    cap = frame.keys()[col - 1]
-    target = target or search.lower().replace(" ", "_")
+    With jpype installed, tabula-py drives tabula-java inside a JVM that is
+    started once per Python process, instead of launching a new ``java``
+    subprocess (and paying its startup cost) for every PDF.
+    """
     try:
-        idx = _get_row_index(frame, search)
-        POPULATION_DATA[f"{target}_count"].append(
-            _parse_int(frame[count][idx]),
+        import jpype  # noqa: F401
+    except ImportError:
+        warnings.warn(
+            "jpype is not installed, so tabula will start a new Java "
+            "process for every PDF report; install jpype1 to reuse a "
+            "single JVM session",
         )
-        POPULATION_DATA[f"{target}_percentage"].append(
-            100 * _parse_int(frame[count][idx]) / _parse_int(frame[cap][idx]),
-        )
-    except IndexError:  # entry was not found
-        POPULATION_DATA[f"{target}_count"].append(0)
-        POPULATION_DATA[f"{target}_percentage"].append(0)
 
 
-def get_publication_filenames(start=2008):
-    """Construct calendar dates for all publications since a given date"""
-    publication_dates = [
-        datetime.fromordinal(ordinal)
-        for ordinal in range(
-            datetime(start, 1, 1).toordinal(),
-            NOW.toordinal(),
-        )
-        if datetime.fromordinal(ordinal).weekday() == 4
-        and datetime.fromordinal(ordinal) != datetime(2013, 1, 4)
+def _jvm_started():
+    """Return whether tabula's JVM is already running in this process"""
+    try:
+        import jpype
+    except ImportError:  # tabula starts a new JVM for every call
+        return False
+    return jpype.isJVMStarted()
+
+
+def _classify_tables(data, profile):
+    """Map each parser's role to the table it reads, in a single pass"""
+    tables = {"totals": data[0]} if data else {}
+    for frame in data:
+        header = str(frame.columns[0])
+        for (role, pattern) in profile["tables"].items():
+            if role not in tables and re.search(pattern, header):
+                tables[role] = frame
+    return tables
+
+
+def _extract_tables(pdf, metrics=None):
+    """Extract only the tables the parsers need from a PDF report
+
+    Pages are read according to `EXTRACTION_PROFILE`, falling back to the
+    whole report if any table is missing. Each table is returned as a
+    `TableIndex`, keyed by its role.
+    """
+    import tabula
+    metrics = metrics or METRICS
+    profile = EXTRACTION_PROFILE
+    for pages in dict.fromkeys([profile["pages"], "all"]):
+        if pages == "all":
+            metrics.count("extraction_fallbacks")
+        # the first extraction in each process also starts the JVM
+        stage = ("extract_tables" if _jvm_started() else
+                 "start_jvm_and_extract_tables")
+        with metrics.stage(stage):
+            data = tabula.read_pdf(pdf, pages=pages, force_subprocess=False)
+        tables = _classify_tables(data, profile)
+        if set(profile["tables"]).issubset(tables):
+            break
+    metrics.count("missing_tables", len(set(profile["tables"]) - set(tables)))
+    return {
+        role: TableIndex(frame, profile["columns"].get(role))
+        for (role, frame) in tables.items()
+    }
+
+
+def _scrape_report(job):
+    """Scrape population figures from a single PDF report
+
+    The job is a ``(source, digest)`` tuple, where ``digest`` is the SHA-256
+    hash of the PDF as of its last scrape (or `None`). Returns the report's
+    current hash, its parsed record (or `None` if the PDF is unchanged), a
+    list of the rows the parsers looked for but could not find, and timings
+    and counters for the job (see `metrics.RunMetrics.as_dict`).
+    """
+    (source, known) = job
+    metrics = RunMetrics()
+    start = time.perf_counter()
+    with metrics.stage("read_source"):
+        content = _read_source(source)
+        digest = hashlib.sha256(content).hexdigest()
+    if digest == known:  # already parsed this exact file
+        metrics.count("reports_unchanged")
+        return (digest, None, [], metrics.as_dict())
+    tables = _extract_tables(BytesIO(content), metrics=metrics)
+    record = {}
+    with metrics.stage("parse_tables"):
+        parse_totals(tables, record)  # total inmate population
+        parse_incarcerated_males(tables, record)  # incarcerated male poulation
+        parse_incarcerated_females(tables, record)  # incarcerated females
+        parse_facility_youths(tables, record)  # facility youth population
+    missing = [
+        f"{role}: {label}"
+        for (role, table) in tables.items()
+        for label in table.missing
     ]
-    # return a list of records published on these dates,
-    # except for a malformed data file on 2013-01-04
-    sources = [
+    metrics.count("reports_parsed")
+    metrics.count("missing_rows", len(missing))
+    metrics.observe("scrape_report", time.perf_counter() - start)
+    return (digest, record, missing, metrics.as_dict())
+
+
+def _scrape_reports(jobs, workers=1):
+    """Scrape reports in order, optionally spread over a process pool"""
+    if workers <= 1:
+        _start_session()
+        yield from map(_scrape_report, jobs)
+        return
+    # each worker keeps its own JVM session for all the reports it handles;
+    # executor.map yields results in the order of its inputs, so records
+    # still come back in publication-date order
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_start_session,
+    ) as executor:
+        yield from executor.map(_scrape_report, jobs)
+
+
+def _resolve_sources(publication_dates):
+    return [
         _get_published_data_from_date(pubdate)
         for pubdate in tqdm.tqdm(
             publication_dates,
@@ -160,139 +554,282 @@ def get_publication_filenames(start=2008):
             desc="Obtaining records",
         )
     ]
-    dates = [
-        pubdate.strftime("%m-%d-%Y")
-        for pubdate in publication_dates
+
+
+def _report_missing(missing):
+    """Summarize rows that were not found, and recorded as 0, by label"""
+    dates = {}
+    for (pubdate, labels) in missing:
+        for label in labels:
+            dates.setdefault(label, []).append(pubdate)
+    for (label, found) in sorted(dates.items()):
+        tqdm.tqdm.write(
+            f"No '{label}' row in {len(found)} report(s), "
+            f"from {found[0]:%m-%d-%Y} to {found[-1]:%m-%d-%Y}",
+        )
+
+
+def _check_fallbacks(counters):
+    """Warn if most reports had to be read in full
+
+    That means the tables the parsers need are no longer (all) on the pages
+    in `EXTRACTION_PROFILE`, so every report pays for two extractions.
+    """
+    parsed = counters.get("reports_parsed", 0)
+    fallbacks = counters.get("extraction_fallbacks", 0)
+    if parsed and fallbacks > FALLBACK_WARNING * parsed:
+        warnings.warn(
+            f"{fallbacks} of {parsed} reports had to be read in full, "
+            "as some tables were not on the pages in EXTRACTION_PROFILE; "
+            "consider updating its \"pages\"",
+        )
+
+
+def get_publication_dates(start=2008):
+    """Construct calendar dates for all publications since a given date"""
+    # every Friday from the first one in the starting year
+    first = datetime(start, 1, 1).toordinal()
+    first += (4 - datetime.fromordinal(first).weekday()) % 7
+    return [
+        datetime.fromordinal(ordinal)
+        for ordinal in range(first, NOW.toordinal(), 7)
+    ]
+
+
+def get_publication_filenames(start=2008):
+    """Construct calendar dates and sources for all publications since a
+    given date
+    """
+    publication_dates = get_publication_dates(start)
+    # return a list of records published on these dates,
+    # skipping weeks without any usable report
+    resolved = [
+        (source, pubdate.strftime("%m-%d-%Y"))
+        for (source, pubdate) in zip(
+            _resolve_sources(publication_dates),
+            publication_dates,
+        )
+        if source is not None
     ]
-    return (sources, dates)
+    return tuple(map(list, zip(*resolved))) or ([], [])
 
 
-def parse_totals(data):
+def parse_totals(tables, record):
     """Parse total population figures from scraped data"""
-    # get frame and first data point
-    frame = data[0]
-    parole = frame.keys()[1]
+    # get table and first data point
+    table = tables["totals"]
 
     # misc. raw total population trends
-    POPULATION_DATA["probation_parole_total"].append(
-        _parse_int(parole),
-    )
-    POPULATION_DATA["field_youth_total"].append(
-        _parse_int(frame[parole][2]),
-    )
+    record["probation_parole_total"] = _parse_int(table.header[1])
+    record["field_youth_total"] = _parse_int(table.columns[1][2])
 
 
-def parse_incarcerated_males(data):
+def parse_incarcerated_males(tables, record):
     """Parse incarcerated male population figures from scraped data"""
-    # get frame and first data point
-    frame = [df for df in data if df.columns[0] == "ADULT INSTITUTIONS"][0]
+    # get table and first data point
+    table = tables["adult"]
 
     # total adult population
-    POPULATION_DATA["inmate_total"].append(
-        _parse_int(frame.keys()[2]),
-    )
-    POPULATION_DATA["inmate_total_percentage"].append(
-        100 * _parse_int(frame.keys()[2]) / _parse_int(frame.keys()[1]),
+    record["inmate_total"] = table.total("count")
+    record["inmate_total_percentage"] = (
+        100 * table.total("count") / table.total("capacity")
     )
 
     # total male population
-    _attempt_search_with_fallback(frame, 2, "SUBTOTAL-MALES",
-                                  target="male_inmate")
+    _attempt_search_with_fallback(table, "SUBTOTAL-MALES",
+                                  record, target="male_inmate")
 
     # maximum security facilities
-    _attempt_search_with_fallback(frame, 2, "MAXIMUM SECURITY",
-                                  target="male_maximum_security")
+    _attempt_search_with_fallback(table, "MAXIMUM SECURITY",
+                                  record, target="male_maximum_security")
 
     # medium security facilities
-    _attempt_search_with_fallback(frame, 2, "MEDIUM SECURITY",
-                                  target="male_medium_security")
+    _attempt_search_with_fallback(table, "MEDIUM SECURITY",
+                                  record, target="male_medium_security")
 
     # minimum security facilities
-    _attempt_search_with_fallback(frame, 2, "MINIMUM SECURITY",
-                                  target="male_minimum_security")
+    _attempt_search_with_fallback(table, "MINIMUM SECURITY",
+                                  record, target="male_minimum_security")
 
 
-def parse_incarcerated_females(data):
+def parse_incarcerated_females(tables, record):
     """Parse incarcerated female population figures from scraped data"""
-    # get frame and first data point
-    frame = [df for df in data if "FEMALES" in df.columns[0]][0]
+    # get table and first data point
+    table = tables["female"]
 
     # total female population
-    POPULATION_DATA["female_inmate_count"].append(
-        _parse_int(frame.keys()[2]),
-    )
-    POPULATION_DATA["female_inmate_percentage"].append(
-        100 * _parse_int(frame.keys()[2]) / _parse_int(frame.keys()[1]),
+    record["female_inmate_count"] = table.total("count")
+    record["female_inmate_percentage"] = (
+        100 * table.total("count") / table.total("capacity")
     )
 
     # minimum security facilities
-    _attempt_search_with_fallback(frame, 2, "MINIMUM SECURITY",
-                                  target="female_minimum_security")
+    _attempt_search_with_fallback(table, "MINIMUM SECURITY",
+                                  record, target="female_minimum_security")
 
 
-def parse_facility_youths(data):
+def parse_facility_youths(tables, record):
     """Parse incarcerated youth population figures from scraped data"""
-    # get frame and column names
-    frame = [df for df in data if "JUVENILE" in df.columns[0]][0]
-    cap = frame.keys()[2]
-    count = frame.keys()[3]
+    # get table
+    table = tables["juvenile"]
 
     # total facility youth population
-    idx = _get_row_index(frame, "Total")
-    POPULATION_DATA["facility_youth_total"].append(
-        _parse_int(frame[count][idx])
-    )
-    POPULATION_DATA["facility_youth_percentage"].append(
-        100 * _parse_int(frame[count][idx]) / _parse_int(frame[cap][idx]),
+    idx = table.find("Total")
+    if idx is None:
+        raise KeyError("no 'Total' row in juvenile facilities table")
+    record["facility_youth_total"] = table.value("count", idx)
+    record["facility_youth_percentage"] = (
+        100 * table.value("count", idx) / table.value("capacity", idx)
     )
 
     # Copper Lake School
-    _attempt_search_with_fallback(frame, 3, "Copper Lake")
+    _attempt_search_with_fallback(table, "Copper Lake", record)
 
     # Ethan Allen
-    _attempt_search_with_fallback(frame, 3, "Ethan Allen")
+    _attempt_search_with_fallback(table, "Ethan Allen", record)
 
     # Grow Academy
-    _attempt_search_with_fallback(frame, 3, "Grow Academy")
+    _attempt_search_with_fallback(table, "Grow Academy", record)
 
     # Lincoln Hills School
-    _attempt_search_with_fallback(frame, 3, "Lincoln Hills")
+    _attempt_search_with_fallback(table, "Lincoln Hills", record)
 
     # Mendota Juvenile Treatment Center
-    _attempt_search_with_fallback(frame, 3, "Mendota")
+    _attempt_search_with_fallback(table, "Mendota", record)
 
     # Southern Oaks Girls School
-    _attempt_search_with_fallback(frame, 3, "Southern Oaks")
-
-
-def get_trends(cleanup=True):
-    """Retrieve inmate population figures from state records"""
-    # get publication dates
-    (sources, pubdates) = get_publication_filenames()
-    POPULATION_DATA["publication_date"] = pubdates
-
-    # range over PDF reports and scrape population trends
-    for source in tqdm.tqdm(
-        sources,
-        total=len(sources),
-        desc="Scraping records",
-    ):
-        data = tabula.read_pdf(source, pages="all")
-        parse_totals(data)  # total inmate population
-        parse_incarcerated_males(data)  # incarcerated male poulation
-        parse_incarcerated_females(data)  # incarcerated female population
-        parse_facility_youths(data)  # facility youth population
+    _attempt_search_with_fallback(table, "Southern Oaks", record)
+
+
+def get_trends(workers=1, refresh=False):
+    """Retrieve inmate population figures from state records
+
+    Returns a `~population.PopulationData` with one row per publication.
+
+    Parsed reports are cached under `CACHE_DIR`, so only reports published
+    since the last run (or parsed by an older `PARSER_VERSION`) are
+    downloaded and parsed. With ``refresh=True``, every report is read
+    again, but only re-parsed if its PDF changed.
+    Yearly archives are kept under `ARCHIVE_DIR` and reused across runs;
+    delete them to force a fresh download. Current-year reports are fetched
+    concurrently into `REPORT_DIR`, using conditional GETs on later runs.
+
+    With ``workers > 1``, PDF reports are scraped concurrently over a
+    process pool of that size; records are merged back in publication order.
+
+    Timings and counters for each stage of the run, including those from
+    worker processes, are collected in `METRICS`.
+    """
+    # get publication dates, and any reports already parsed
+    publication_dates = get_publication_dates()
+    with METRICS.stage("load_cache"):
+        cached = {
+            pubdate: _load_cached_report(pubdate)
+            for pubdate in publication_dates
+        }
+    pending = [
+        pubdate for pubdate in publication_dates
+        if refresh or cached[pubdate] is None
+    ]
+    METRICS.count("reports_cached", len(publication_dates) - len(pending))
+    # skip weeks without any usable report
+    with METRICS.stage("resolve_sources"):
+        resolved = [
+            (pubdate, source)
+            for (pubdate, source) in zip(pending, _resolve_sources(pending))
+            if source is not None
+        ]
+    with METRICS.stage("fetch_reports"):
+        # also skip weeks whose report has not been posted (yet)
+        resolved = [
+            (pubdate, source)
+            for (pubdate, source) in zip(
+                [pubdate for (pubdate, _) in resolved],
+                _fetch_reports([source for (_, source) in resolved]),
+            )
+            if source is not None
+        ]
+    METRICS.count("reports_unpublished", len(pending) - len(resolved))
+    pending = [pubdate for (pubdate, _) in resolved]
+    jobs = [
+        (source, (cached[pubdate] or {}).get("sha256"))
+        for (pubdate, source) in resolved
+    ]
 
-    if cleanup:  # clean up downloaded PDFs
-        for folder in FOLDERS_TO_CLEAN:
-            shutil.rmtree(folder)
+    # range over new PDF reports and scrape population trends
+    (missing, counts) = ([], RunMetrics())
+    with METRICS.stage("scrape_reports"):
+        for (pubdate, (digest, record, labels, metrics)) in zip(
+            pending,
+            tqdm.tqdm(
+                _scrape_reports(jobs, workers=workers),
+                total=len(jobs),
+                desc="Scraping records",
+            ),
+        ):
+            if record is not None:  # new or changed report
+                cached[pubdate] = _cache_report(pubdate, digest, record)
+            if labels:
+                missing.append((pubdate, labels))
+            METRICS.merge(metrics)
+            counts.merge(metrics)
+    _report_missing(missing)
+    _check_fallbacks(counts.counters)
+
+    # assemble records in publication order
+    with METRICS.stage("assemble"):
+        publication_dates = [
+            pubdate for pubdate in publication_dates
+            if cached[pubdate] is not None
+        ]
+        trends = PopulationData(publication_dates)
+        for pubdate in publication_dates:
+            trends.record(pubdate, cached[pubdate]["record"])
+    return trends
 
 
 # -- main block ---------------------------------------------------------------
 
 if __name__ == "__main__":
-    get_trends()
-
-    # write data to file
-    with open("doc-population-trends.json", "w") as output:
-        output.write(json.dumps(POPULATION_DATA, indent=2))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes used to scrape PDF reports, default: 1",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="doc-population-trends.npz",
+        help="file to write trends to, in a format set by its extension "
+             "(.npz, .json or .csv), default: %(default)s",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        default=False,
+        help="re-download cached reports and re-parse any that changed",
+    )
+    parser.add_argument(
+        "--report",
+        metavar="PATH",
+        help="write a JSON report of time spent in each stage of the run, "
+             "and counts of fallbacks and missing tables, to this file",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="profile the main process with cProfile, and dump its stats "
+             "to this file",
+    )
+    args = parser.parse_args()
+    with profiled(args.profile):
+        with METRICS.stage("total"):
+            trends = get_trends(workers=args.workers, refresh=args.refresh)
+            # write data to file
+            with METRICS.stage("write"):
+                trends.write(args.output)
+    if args.report:
+        METRICS.write(args.report)
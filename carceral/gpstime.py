@@ -0,0 +1,88 @@
+"""Vectorized conversion of calendar dates to GPS time
+
+These are drop-in replacements for `gwpy.time.to_gps`, for the plain UTC
+dates and times used to plot DOC population trends. Whole arrays are
+converted with a single NumPy operation, rather than one astropy call each.
+"""
+
+import functools
+
+import numpy
+
+# start of GPS time
+GPS_EPOCH = numpy.datetime64("1980-01-06T00:00:00", "s")
+
+# UTC times at which a leap second was added since the GPS epoch
+LEAP_SECONDS = numpy.array([
+    "1981-07-01", "1982-07-01", "1983-07-01", "1985-07-01", "1988-01-01",
+    "1990-01-01", "1991-01-01", "1992-07-01", "1993-07-01", "1994-07-01",
+    "1996-01-01", "1997-07-01", "1999-01-01", "2006-01-01", "2009-01-01",
+    "2012-07-01", "2015-07-01", "2017-01-01",
+], dtype="datetime64[s]")
+
+
+def to_gps_array(times):
+    """Convert UTC dates or times to GPS seconds
+
+    Parameters
+    ----------
+    times : `numpy.ndarray`, `list`, or scalar
+        anything NumPy can cast to ``datetime64``, e.g. ISO-format strings,
+        `datetime.datetime` objects, or ``datetime64`` values
+
+    Returns
+    -------
+    gps : `numpy.ndarray` of `float`
+        GPS time of each input, in seconds
+    """
+    times = numpy.asarray(times, dtype="datetime64[s]")
+    leaps = numpy.searchsorted(LEAP_SECONDS, times, side="right")
+    return (times - GPS_EPOCH).astype(float) + leaps
+
+
+def gps(time):
+    """Convert a single UTC date or time (or ``"now"``) to GPS seconds
+
+    Results for fixed dates are memoized, so annotations and axis limits
+    repeated across figures are only converted once per process; ``"now"``
+    is converted afresh every time.
+    """
+    if time == "now":
+        return float(to_gps_array(time))
+    return _gps(time)
+
+
+@functools.lru_cache(maxsize=None)
+def _gps(time):
+    return float(to_gps_array(time))
+
+
+def calendar_ticks(first, last, until="now"):
+    """Return GPS tick positions for each year between two years inclusive
+
+    Major ticks fall on the first day of each year, and minor ticks on the
+    first day of every other month before ``until``.
+    """
+    # minor ticks only change once ``until`` passes the start of a month,
+    # so memoize on the first month not to be ticked, rather than on
+    # ``until`` itself (which may be "now")
+    until = numpy.datetime64(until, "s")
+    cutoff = (until - numpy.timedelta64(1, "s")).astype("datetime64[M]") + 1
+    return _calendar_ticks(first, last, str(cutoff))
+
+
+@functools.lru_cache(maxsize=None)
+def _calendar_ticks(first, last, cutoff):
+    months = numpy.arange(
+        f"{first}-01",
+        f"{last + 1}-01",
+        dtype="datetime64[M]",
+    )
+    january = (months.astype(int) % 12) == 0
+    major = to_gps_array(months[january])
+    minor = to_gps_array(
+        months[~january & (months < numpy.datetime64(cutoff, "M"))],
+    )
+    # cached arrays are shared, so make sure they are never modified
+    major.flags.writeable = minor.flags.writeable = False
+    return (major, minor)
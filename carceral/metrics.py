@@ -0,0 +1,142 @@
+"""Stage timers, latency histograms and counters for pipeline runs
+
+A `RunMetrics` collects the wall-clock time spent in each named stage, the
+latency of individual items (e.g. one report), and counts of notable events,
+and writes them out as a JSON run report. Metrics gathered in worker
+processes are sent back as plain dicts, via `RunMetrics.as_dict`, and merged
+into the parent's with `RunMetrics.merge`.
+"""
+
+import bisect
+import contextlib
+import json
+import threading
+import time
+
+# upper edges of latency histogram bins, in seconds
+LATENCY_BINS = (0.01, 0.03, 0.1, 0.3, 1, 3, 10, 30, 100)
+
+
+# -- utilities ----------------------------------------------------------------
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summarize(latencies):
+    """Summarize a list of latencies, with a histogram over `LATENCY_BINS`"""
+    ordered = sorted(latencies)
+    counts = [0] * (len(LATENCY_BINS) + 1)
+    for value in ordered:
+        counts[bisect.bisect_left(LATENCY_BINS, value)] += 1
+    labels = [f"<={edge}" for edge in LATENCY_BINS] + [f">{LATENCY_BINS[-1]}"]
+    return {
+        "count": len(ordered),
+        "total": sum(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "median": _percentile(ordered, 0.5),
+        "p90": _percentile(ordered, 0.9),
+        "max": ordered[-1],
+        "histogram": dict(zip(labels, counts)),
+    }
+
+
+# -- metrics ------------------------------------------------------------------
+
+class RunMetrics(object):
+    """Timings and counters for one run
+
+    Stages may be nested (e.g. archive downloads happen while resolving
+    sources), in which case their times overlap. All methods are safe to
+    call from several threads at once.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.latencies = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time a block of code as (one call of) a named stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds, calls=1):
+        with self._lock:
+            (count, total) = self.stages.get(name, (0, 0.))
+            self.stages[name] = (count + calls, total + seconds)
+
+    def observe(self, name, seconds):
+        """Record the latency of one item, e.g. one report"""
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self):
+        """Return raw metrics as plain Python types, for merging"""
+        with self._lock:
+            return {
+                "stages": dict(self.stages),
+                "latencies": {
+                    name: list(values)
+                    for (name, values) in self.latencies.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+    def merge(self, other):
+        """Add the raw metrics from `as_dict` of another run into this one"""
+        for (name, (calls, seconds)) in other["stages"].items():
+            self.add_time(name, seconds, calls=calls)
+        for (name, values) in other["latencies"].items():
+            with self._lock:
+                self.latencies.setdefault(name, []).extend(values)
+        for (name, n) in other["counters"].items():
+            self.count(name, n)
+
+    def report(self):
+        """Return a summary of this run, suitable for writing as JSON"""
+        with self._lock:
+            return {
+                "stages": {
+                    name: {"calls": calls, "seconds": seconds}
+                    for (name, (calls, seconds)) in self.stages.items()
+                },
+                "latencies": {
+                    name: _summarize(values)
+                    for (name, values) in self.latencies.items()
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def write(self, path):
+        """Write the run report to a JSON file"""
+        with open(path, "w") as output:
+            output.write(json.dumps(self.report(), indent=2))
+
+
+@contextlib.contextmanager
+def profiled(path=None):
+    """Run a block of code under cProfile, and dump its stats to ``path``
+
+    If ``path`` is `None`, this does nothing. Only the calling process is
+    profiled, not any worker processes it starts.
+    """
+    if path is None:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
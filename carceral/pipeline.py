@@ -0,0 +1,280 @@
+"""Run every step from scraping DOC reports to plotting them, as needed
+
+Steps are modelled as a graph of stages, each with the stages it runs after,
+the files and code it reads, and the files it writes:
+
+    scrape -> doc-population-trends.npz -> export_csv
+                                        -> figures
+                                        -> rate_figure
+
+Before a stage runs, its inputs are fingerprinted. A stage is only run again
+if its fingerprint changed since it last succeeded, or an output is missing,
+so a run with nothing new finishes almost at once. Stages whose
+dependencies are done run concurrently, each in its own process, so that
+global plotting settings made by one stage never leak into another.
+
+The scrape stage cannot see whether DOC published anything without going
+online, so it is fingerprinted by the weekly publication dates up to today:
+it runs again once a new report is due, while the latest one due is missing
+from its output (e.g. if it was posted late), or when ``--refresh`` is
+given.
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import time
+
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    wait,
+)
+
+from population import PopulationData
+
+# directory holding the pipeline code
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# data products
+TRENDS_FILE = "doc-population-trends.npz"
+CSV_FILE = "doc-population-trends.csv"
+
+# fingerprints of the inputs each stage last succeeded with
+STATE_FILE = os.path.join(".doc-cache", "pipeline.json")
+
+
+# -- stages -------------------------------------------------------------------
+
+def _publication_key():
+    from get_doc_trends import get_publication_dates
+    return [
+        pubdate.strftime("%Y-%m-%d")
+        for pubdate in get_publication_dates()
+    ]
+
+
+def _latest_week_scraped():
+    """Return whether the trends include the latest report that is due"""
+    from get_doc_trends import get_publication_dates
+    dates = get_publication_dates()
+    trends = PopulationData.read(TRENDS_FILE, fields=())
+    return not dates or dates[-1].date() in trends.index
+
+
+def _scrape(workers=1, refresh=False, **kwargs):
+    from get_doc_trends import get_trends
+    get_trends(workers=workers, refresh=refresh).write(TRENDS_FILE)
+
+
+def _export_csv(**kwargs):
+    PopulationData.read(TRENDS_FILE).write(CSV_FILE)
+
+
+def _render_figures(force=False, **kwargs):
+    from unpack_doc_trends import render_figures
+    os.makedirs("fig", exist_ok=True)
+    render_figures(PopulationData.read(TRENDS_FILE), force=force)
+
+
+def _render_rate_figure(**kwargs):
+    from rates import get_rates
+    from trend_with_rate import plot_incarcerated_total
+    data = PopulationData.read(TRENDS_FILE)
+    (_, rates) = get_rates(data)
+    plot_incarcerated_total(data, rates)
+
+
+# for each stage, the function that runs it, the stages it runs after, the
+# files and code modules it reads, any other inputs to fingerprint (as a
+# callable returning JSON-serializable data), the files it writes, and any
+# check that those are complete (as a callable returning a `bool`), without
+# which the stage runs again even if its inputs have not changed
+STAGES = {
+    "scrape": {
+        "run": _scrape,
+        "after": (),
+        "inputs": (),
+        "code": ("get_doc_trends.py", "population.py"),
+        "key": _publication_key,
+        "outputs": (TRENDS_FILE,),
+        "complete": _latest_week_scraped,
+    },
+    "export_csv": {
+        "run": _export_csv,
+        "after": ("scrape",),
+        "inputs": (TRENDS_FILE,),
+        "code": ("population.py",),
+        "key": None,
+        "outputs": (CSV_FILE,),
+        "complete": None,
+    },
+    "figures": {
+        "run": _render_figures,
+        "after": ("scrape",),
+        "inputs": (TRENDS_FILE,),
+        "code": ("unpack_doc_trends.py", "gpstime.py", "population.py"),
+        "key": None,
+        "outputs": (
+            "fig/doc-youth-count.png",
+            "fig/doc-total-percent.png",
+            "fig/doc-total-count.png",
+        ),
+        "complete": None,
+    },
+    "rate_figure": {
+        "run": _render_rate_figure,
+        "after": ("scrape",),
+        "inputs": (TRENDS_FILE,),
+        "code": (
+            "trend_with_rate.py",
+            "rates.py",
+            "gpstime.py",
+            "population.py",
+        ),
+        "key": None,
+        "outputs": ("doc-total-percent.png",),
+        "complete": None,
+    },
+}
+
+
+# -- utilities ----------------------------------------------------------------
+
+def _hash_file(digest, path):
+    digest.update(path.encode())
+    with open(path, "rb") as data:
+        for chunk in iter(functools.partial(data.read, 1 << 20), b""):
+            digest.update(chunk)
+
+
+def _fingerprint(stage):
+    """Hash everything a stage reads: input files, code, and any other key
+    """
+    digest = hashlib.sha256()
+    for path in stage["inputs"]:
+        _hash_file(digest, path)
+    for module in stage["code"]:
+        _hash_file(digest, os.path.join(CODE_DIR, module))
+    if stage["key"] is not None:
+        digest.update(json.dumps(stage["key"]()).encode())
+    return digest.hexdigest()
+
+
+def _load_state():
+    try:
+        with open(STATE_FILE, "r") as saved:
+            return json.load(saved)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    with open(f"{STATE_FILE}.tmp", "w") as saved:
+        json.dump(state, saved, indent=2)
+    os.replace(f"{STATE_FILE}.tmp", STATE_FILE)
+
+
+def _is_current(stage, fingerprint, saved):
+    return (
+        fingerprint == saved
+        and all(map(os.path.exists, stage["outputs"]))
+        and (stage["complete"] is None or stage["complete"]())
+    )
+
+
+# -- pipeline -----------------------------------------------------------------
+
+def run_pipeline(workers=1, refresh=False, force=False):
+    """Run every stage in `STAGES` that is out of date, in dependency order
+
+    Stages whose dependencies are done are run concurrently, each in a
+    separate process.
+
+    Parameters
+    ----------
+    workers : `int`, optional
+        number of processes used to scrape PDF reports, default: 1
+
+    refresh : `bool`, optional
+        re-read every report, even if no new one is due, default: `False`
+
+    force : `bool`, optional
+        run every stage, and re-render every figure, default: `False`
+
+    Returns
+    -------
+    ran : `list` of `str`
+        names of the stages that were run, in order of completion
+    """
+    options = {"workers": workers, "refresh": refresh, "force": force}
+    state = _load_state()
+    (pending, done, ran) = (dict(STAGES), set(), [])
+    with ProcessPoolExecutor(max_workers=len(STAGES)) as executor:
+        running = {}
+        while pending or running:
+            # start (or skip) every stage whose dependencies are done,
+            # repeating while skipped stages free up others
+            ready = [
+                name for (name, stage) in pending.items()
+                if done.issuperset(stage["after"])
+            ]
+            for name in ready:
+                stage = pending.pop(name)
+                fingerprint = _fingerprint(stage)
+                if not (
+                    force
+                    or (refresh and name == "scrape")
+                    or not _is_current(stage, fingerprint, state.get(name))
+                ):
+                    print(f"{name}: up to date")
+                    done.add(name)
+                    continue
+                future = executor.submit(stage["run"], **options)
+                running[future] = (name, fingerprint, time.perf_counter())
+            if ready:
+                continue
+            if not running:  # nothing left that can run
+                break
+
+            # record each stage as it finishes
+            (finished, _) = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                (name, fingerprint, start) = running.pop(future)
+                future.result()  # re-raise any errors
+                print(f"{name}: done in {time.perf_counter() - start:.1f} s")
+                state[name] = fingerprint
+                _save_state(state)
+                done.add(name)
+                ran.append(name)
+    return ran
+
+
+# -- main block ---------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes used to scrape PDF reports, default: 1",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        default=False,
+        help="re-scrape reports even if no new one is due",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        default=False,
+        help="run every stage, even if its inputs have not changed",
+    )
+    args = parser.parse_args()
+    run_pipeline(workers=args.workers, refresh=args.refresh, force=args.force)
@@ -0,0 +1,271 @@
+"""Columnar storage for weekly Wisconsin DOC population figures
+
+Figures are kept as one NumPy array per column, indexed by publication date,
+and can be written to (or read back from) any of the formats in `READERS`
+and `WRITERS`. Columns in the binary ``.npz`` format are stored uncompressed
+and memory-mapped straight from the file when read, so nothing is parsed or
+copied up front, and readers only pay for the pages of columns they use.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import struct
+import zipfile
+
+import numpy
+
+# numeric columns, in output order
+FIELDS = (
+    # basic summary
+    "probation_parole_total",
+    "inmate_total",
+    "inmate_total_percentage",
+    "facility_youth_total",
+    "facility_youth_percentage",
+    "field_youth_total",
+    # incarcerated youth
+    "copper_lake_count",
+    "copper_lake_percentage",
+    "ethan_allen_count",
+    "ethan_allen_percentage",
+    "grow_academy_count",
+    "grow_academy_percentage",
+    "lincoln_hills_count",
+    "lincoln_hills_percentage",
+    "mendota_count",
+    "mendota_percentage",
+    "southern_oaks_count",
+    "southern_oaks_percentage",
+    # incarcerated adult males
+    "male_inmate_count",
+    "male_inmate_percentage",
+    "male_maximum_security_count",
+    "male_maximum_security_percentage",
+    "male_medium_security_count",
+    "male_medium_security_percentage",
+    "male_minimum_security_count",
+    "male_minimum_security_percentage",
+    # incarcerated adult females
+    "female_inmate_count",
+    "female_inmate_percentage",
+    "female_minimum_security_count",
+    "female_minimum_security_percentage",
+)
+
+# date format used by text formats
+DATE_FORMAT = "%m-%d-%Y"
+
+
+# -- utilities ----------------------------------------------------------------
+
+def _is_integer_field(field):
+    return not field.endswith("_percentage")
+
+
+def _format_column(field, column):
+    """Convert a column to a list of plain Python values for text output"""
+    if _is_integer_field(field):
+        return [
+            int(value) if numpy.isfinite(value) else value
+            for value in column.tolist()
+        ]
+    return column.tolist()
+
+
+def _format_dates(dates):
+    return [date.strftime(DATE_FORMAT) for date in dates.tolist()]
+
+
+def _parse_dates(dates):
+    return numpy.array([
+        numpy.datetime64(f"{date[6:]}-{date[:2]}-{date[3:5]}")
+        for date in dates
+    ], dtype="datetime64[D]")
+
+
+# -- readers and writers ------------------------------------------------------
+
+def _read_csv(path, fields):
+    # only keep the requested columns while streaming through the rows
+    with open(path, "r") as datafile:
+        reader = csv.reader(datafile)
+        header = next(reader)
+        idx = [header.index(field) for field in ("publication_date",) + fields]
+        columns = [[] for _ in idx]
+        for row in reader:
+            for (column, i) in zip(columns, idx):
+                column.append(row[i])
+    return (
+        _parse_dates(columns[0]),
+        {
+            field: numpy.array(column, dtype=float)
+            for (field, column) in zip(fields, columns[1:])
+        },
+    )
+
+
+def _write_csv(store, path):
+    fields = list(store.columns)
+    with open(path, "w") as output:
+        writer = csv.writer(output)
+        writer.writerow(["publication_date"] + fields)
+        writer.writerows(zip(
+            _format_dates(store.dates),
+            *[_format_column(field, store[field]) for field in fields]
+        ))
+
+
+def _read_json(path, fields):
+    with open(path, "r") as datafile:
+        data = json.load(datafile)
+    return (
+        _parse_dates(data["publication_date"]),
+        {field: numpy.asarray(data[field], dtype=float) for field in fields},
+    )
+
+
+def _write_json(store, path):
+    data = {"publication_date": _format_dates(store.dates)}
+    data.update({
+        field: _format_column(field, column)
+        for (field, column) in store.columns.items()
+    })
+    with open(path, "w") as output:
+        output.write(json.dumps(data, indent=2))
+
+
+def _map_member(archive, datafile, name):
+    """Memory-map an array stored in an ``.npz`` archive, read-only
+
+    Members that cannot be mapped in place (e.g. if they were compressed)
+    are read into memory instead.
+    """
+    from numpy.lib import format as npy
+    info = archive.getinfo(name)
+    if info.compress_type != zipfile.ZIP_STORED:
+        with archive.open(info) as member:
+            return npy.read_array(member)
+    # skip the member's local file header, which ends with its (variable
+    # length) name and extra fields
+    datafile.seek(info.header_offset + 26)
+    (name_length, extra_length) = struct.unpack("<HH", datafile.read(4))
+    datafile.seek(info.header_offset + 30 + name_length + extra_length)
+    version = npy.read_magic(datafile)
+    (shape, fortran_order, dtype) = (
+        npy.read_array_header_1_0(datafile) if version == (1, 0)
+        else npy.read_array_header_2_0(datafile)
+    )
+    if not numpy.prod(shape, dtype=int):  # empty files cannot be mapped
+        return numpy.empty(shape, dtype=dtype)
+    return numpy.memmap(
+        datafile,
+        dtype=dtype,
+        mode="r",
+        offset=datafile.tell(),
+        shape=shape,
+        order="F" if fortran_order else "C",
+    )
+
+
+def _read_npz(path, fields):
+    # numpy.load would decode every member it returns into memory
+    with zipfile.ZipFile(path, "r") as archive, open(path, "rb") as datafile:
+        return (
+            _map_member(archive, datafile, "publication_date.npy"),
+            {
+                field: _map_member(archive, datafile, f"{field}.npy")
+                for field in fields
+            },
+        )
+
+
+def _write_npz(store, path):
+    # write then rename, so arrays mapped from an earlier version of the
+    # file stay valid
+    with open(f"{path}.tmp", "wb") as output:
+        numpy.savez(output, publication_date=store.dates, **store.columns)
+    os.replace(f"{path}.tmp", path)
+
+
+# readers and writers by file extension
+READERS = {
+    ".csv": _read_csv,
+    ".json": _read_json,
+    ".npz": _read_npz,
+}
+WRITERS = {
+    ".csv": _write_csv,
+    ".json": _write_json,
+    ".npz": _write_npz,
+}
+
+
+# -- data container -----------------------------------------------------------
+
+class PopulationData(object):
+    """Weekly population figures, stored as one array per column
+
+    Parameters
+    ----------
+    dates : `list` of `datetime.date`
+        publication dates, in order, one per row
+
+    fields : `tuple` of `str`, optional
+        columns to allocate, default: all of `FIELDS`
+    """
+    def __init__(self, dates, fields=FIELDS):
+        self.dates = numpy.array(dates, dtype="datetime64[D]")
+        self.index = {
+            date: i for (i, date) in enumerate(self.dates.tolist())
+        }
+        self.columns = {
+            field: numpy.zeros(len(self.dates))
+            for field in fields
+        }
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def record(self, date, record):
+        """Fill in the row for a publication date from a parsed report"""
+        row = self.index[numpy.datetime64(date, "D").item()]
+        for (field, value) in record.items():
+            self.columns[field][row] = value
+
+    def fingerprint(self, fields=None):
+        """Return a SHA-256 hash of the dates and the given columns
+
+        Parameters
+        ----------
+        fields : `list` of `str`, optional
+            columns to hash, in order, default: all columns
+        """
+        digest = hashlib.sha256(self.dates.tobytes())
+        for field in (self.columns if fields is None else fields):
+            digest.update(field.encode())
+            digest.update(numpy.ascontiguousarray(self[field]).tobytes())
+        return digest.hexdigest()
+
+    @classmethod
+    def read(cls, path, fields=FIELDS):
+        """Read the given columns from a file, in a format set by extension
+
+        Every column is parsed as a float array, and publication dates as
+        ``datetime64`` values, whatever the format. Arrays read from ``.npz``
+        files are read-only memory maps.
+        """
+        ext = os.path.splitext(path)[1]
+        (dates, columns) = READERS[ext](path, tuple(fields))
+        new = cls(dates, fields=())
+        new.columns = columns
+        return new
+
+    def write(self, path):
+        """Write all columns to a file, in a format set by extension"""
+        ext = os.path.splitext(path)[1]
+        return WRITERS[ext](self, path)
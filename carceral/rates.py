@@ -0,0 +1,112 @@
+"""Smoothed trends and growth rates for weekly DOC population figures
+
+All columns are smoothed and differentiated together, with one 2-D
+Savitzky-Golay filter call each, and the results are cached on disk next to
+the data so that plots can use them for free.
+"""
+
+import hashlib
+import inspect
+import sys
+
+import numpy
+
+# default location of the cached results
+RATES_FILE = "doc-population-rates.npz"
+
+# sampling interval of the weekly reports
+WEEK = numpy.timedelta64(7, "D")
+
+
+# -- utilities ----------------------------------------------------------------
+
+def _fingerprint(data, fields, window, order):
+    """Hash the settings, the code of this module, and the input data"""
+    digest = hashlib.sha256(f"{window}:{order}".encode())
+    digest.update(inspect.getsource(sys.modules[__name__]).encode())
+    digest.update(data.fingerprint(fields).encode())
+    return digest.hexdigest()
+
+
+def _load_cached(path, fingerprint, fields):
+    try:
+        with numpy.load(path) as cached:
+            if str(cached["fingerprint"]) != fingerprint:
+                return None
+            return (
+                {field: cached[f"smoothed_{field}"] for field in fields},
+                {field: cached[f"rate_{field}"] for field in fields},
+            )
+    except (FileNotFoundError, KeyError):
+        return None
+
+
+# -- rate computation ---------------------------------------------------------
+
+def compute_rates(data, fields=None, window=15, order=2):
+    """Smooth every column of a dataset, and take its rate of change
+
+    Reports are not always exactly a week apart (some weeks are missing),
+    so columns are first interpolated onto a regular weekly grid, filtered
+    there, then sampled back at the original publication dates.
+
+    Parameters
+    ----------
+    data : `~population.PopulationData`
+        weekly population figures
+
+    fields : `list` of `str`, optional
+        columns to process, default: all columns of ``data``
+
+    window : `int`, optional
+        length of the filter window, in weeks, default: 15
+
+    order : `int`, optional
+        order of the polynomial fit within each window, default: 2
+
+    Returns
+    -------
+    smoothed, rate : `dict` of `numpy.ndarray`
+        smoothed values, and their rates of change per week, by column
+    """
+    from scipy.signal import savgol_filter
+    fields = list(data.columns if fields is None else fields)
+    days = (data.dates - data.dates[0]).astype(float)
+    grid = numpy.arange(0, days[-1] + 1, WEEK.astype(float))
+    values = numpy.array([
+        numpy.interp(grid, days, data[field])
+        for field in fields
+    ])
+    smoothed = savgol_filter(values, window, order, axis=-1)
+    rate = savgol_filter(values, window, order, deriv=1, axis=-1)
+    return (
+        {
+            field: numpy.interp(days, grid, row)
+            for (field, row) in zip(fields, smoothed)
+        },
+        {
+            field: numpy.interp(days, grid, row)
+            for (field, row) in zip(fields, rate)
+        },
+    )
+
+
+def get_rates(data, fields=None, window=15, order=2, path=RATES_FILE):
+    """Return smoothed values and rates, from the cache at ``path`` if it
+    was computed from the same data and settings
+
+    See `compute_rates` for a description of the arguments.
+    """
+    fields = list(data.columns if fields is None else fields)
+    fingerprint = _fingerprint(data, fields, window, order)
+    cached = _load_cached(path, fingerprint, fields)
+    if cached is not None:
+        return cached
+    (smoothed, rate) = compute_rates(data, fields, window, order)
+    numpy.savez(
+        path,
+        fingerprint=fingerprint,
+        **{f"smoothed_{field}": smoothed[field] for field in fields},
+        **{f"rate_{field}": rate[field] for field in fields},
+    )
+    return (smoothed, rate)
@@ -1,38 +1,70 @@
-import csv
-import os
-
-from scipy.signal import savgol_filter
-
-from gwpy.time import to_gps
-from gwpy.timeseries import TimeSeries
+"""Plot the weekly Wisconsin DOC population with its rate of change"""
 
-from matplotlib import use
-use("Agg")
-
-from matplotlib import font_manager, pyplot, rcParams  # noqa: E402
+import json
+import os
 
+from gpstime import (calendar_ticks, gps, to_gps_array)
+from population import PopulationData
+from rates import get_rates
+
+# render with a non-interactive backend, whenever matplotlib is imported
+os.environ["MPLBACKEND"] = "Agg"
+
+# font properties
+FONT_DIR = os.path.join(os.environ["HOME"], "Downloads", "vollkorn")
+FONT_FAMILY = "vollkorn"
+FONT_CACHE = os.path.join(".doc-cache", "fonts.json")
+
+
+# -- utilities --------------------------------------------------------
+
+def _set_fonts():
+    """Register fonts from `FONT_DIR` and set the font family globally
+
+    The list of font files is cached in `FONT_CACHE`, and the directory is
+    only scanned again when its modification time changes.
+    """
+    from matplotlib import (font_manager, rcParams)
+    try:
+        mtime = os.stat(FONT_DIR).st_mtime
+    except FileNotFoundError:
+        mtime = None
+    try:
+        with open(FONT_CACHE, "r") as cached:
+            cache = json.load(cached)
+    except (FileNotFoundError, ValueError):
+        cache = {}
+    if (cache.get("dir"), cache.get("mtime")) == (FONT_DIR, mtime):
+        fonts = cache["fonts"]
+    else:
+        fonts = font_manager.findSystemFonts(FONT_DIR) if mtime else []
+        os.makedirs(os.path.dirname(FONT_CACHE), exist_ok=True)
+        with open(FONT_CACHE, "w") as cached:
+            json.dump({"dir": FONT_DIR, "mtime": mtime, "fonts": fonts},
+                      cached)
+    for font in fonts:
+        font_manager.fontManager.addfont(font)
+    rcParams["font.family"] = FONT_FAMILY
 
-# set font properties
-font_dir = os.path.join(os.environ["HOME"], "Downloads", "vollkorn")
-for font in font_manager.findSystemFonts(font_dir):
-    font_manager.fontManager.addfont(font)
 
-# set font family globally
-rcParams["font.family"] = "vollkorn"
+# -- plotting utilities -----------------------------------------------
 
 
-# -- plotting utilities -----------------------------------------------
+def plot_incarcerated_total(data, rates):
+    """Parse input and plot trends for the incarcerated population
 
+    ``rates`` maps column names to weekly growth rates, as returned by
+    `rates.get_rates`.
+    """
+    from gwpy.timeseries import TimeSeries
+    from matplotlib import pyplot
+    _set_fonts()
 
-def plot_incarcerated_total(data):
-    """Parse input and plot trends for the incarcerated population"""
-    times = [float(to_gps(t)) for t in data["publication_date"]]
+    times = to_gps_array(data.dates)
     trends = TimeSeries(data["inmate_total"], times=times) / 1000
-    rate = type(trends)(
-        savgol_filter(trends.value, 15, 2, deriv=1)
-    ) * 1000
-    rate.__array_finalize__(trends)
+    rate = TimeSeries(rates["inmate_total"], times=times)
     xticks = [str(n) for n in range(2018, 2022)]
+    (major, minor) = calendar_ticks(2018, 2021, until="2021-08-06")
 
     # stand up axes
     (fig, (tax, rax)) = pyplot.subplots(
@@ -45,7 +77,7 @@ def plot_incarcerated_total(data):
     # plot total population
     tax.plot(trends, color="#0d2240", linewidth=2)
     tax.plot(
-        [float(to_gps("2019-01-07"))] * 2,
+        [gps("2019-01-07")] * 2,
         [19, 24],
         color="#0d2240",
         alpha=0.6,
@@ -53,7 +85,7 @@ def plot_incarcerated_total(data):
         linewidth=1,
     )
     tax.plot(
-        [float(to_gps("2020-03-25"))] * 2,
+        [gps("2020-03-25")] * 2,
         [19, 24],
         color="#0d2240",
         alpha=0.6,
@@ -62,27 +94,22 @@ def plot_incarcerated_total(data):
     )
     tax.set_xlim(
         [
-            float(to_gps("2018-01-01")),
-            float(to_gps("2021-08-06")),
+            gps("2018-01-01"),
+            gps("2021-08-06"),
         ]
     )
-    tax.set_xticks(
-        [float(to_gps(f"{yr}-{mo}-01"))
-         for yr in xticks for mo in range(2, 13)
-         if to_gps(f"{yr}-{mo}-01") < to_gps("2021-08-06")],
-        minor=True,
-    )
-    tax.set_xticks([float(to_gps(f"{yr}-01-01")) for yr in xticks])
+    tax.set_xticks(minor, minor=True)
+    tax.set_xticks(major)
     tax.set_xticklabels(xticks)
     tax.set_ylabel(r"Total population ($\times$ 1000)")
     tax.set_ylim([19, 24])
     tax.text(
-        float(to_gps("2019-01-21")),
+        gps("2019-01-21"),
         21.15,
         "Evers administration\nbegins",
     )
     tax.text(
-        float(to_gps("2020-04-08")),
+        gps("2020-04-08"),
         19.65,
         "COVID-19 lockdown\nbegins",
     )
@@ -91,7 +118,7 @@ def plot_incarcerated_total(data):
     # plot rate of change
     rax.plot(rate, color="#00a8e1", linewidth=2)
     rax.plot(
-        [float(to_gps("2019-01-07"))] * 2,
+        [gps("2019-01-07")] * 2,
         [-160, 60],
         color="#0d2240",
         alpha=0.6,
@@ -99,7 +126,7 @@ def plot_incarcerated_total(data):
         linewidth=1,
     )
     rax.plot(
-        [float(to_gps("2020-03-25"))] * 2,
+        [gps("2020-03-25")] * 2,
         [-160, 60],
         color="#0d2240",
         alpha=0.6,
@@ -118,17 +145,11 @@ def plot_incarcerated_total(data):
 # -- main block -------------------------------------------------------
 
 if __name__ == "__main__":
-    # load from CSV
-    with open("doc-population-trends.csv", "r") as datafile:
-        data = {
-            col[0]: [
-                float(value)
-                if value.isnumeric()
-                else value
-                for value in col[1:]
-            ]
-            for col in list(map(list, zip(*csv.reader(datafile))))
-        }
+    # load from binary data file
+    data = PopulationData.read("doc-population-trends.npz")
+
+    # smooth and differentiate all columns at once, or reuse cached results
+    (_, rates) = get_rates(data)
 
     # render population trends as timeseries figures
-    plot_incarcerated_total(data)
+    plot_incarcerated_total(data, rates)
@@ -1,38 +1,82 @@
-import csv
+"""Plot weekly Wisconsin DOC population trends, and export them to CSV"""
+
+import argparse
+import hashlib
+import inspect
 import json
+import numpy
 import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+
+from gpstime import (calendar_ticks, gps, to_gps_array)
+from population import PopulationData
 
-from gwpy.time import to_gps
-from gwpy.timeseries import (TimeSeries, TimeSeriesDict)
+# render with a non-interactive backend, whenever matplotlib is imported
+os.environ["MPLBACKEND"] = "Agg"
 
-from matplotlib import use
-use("Agg")
+# columns plotted in each figure
+YOUTH_FIELDS = (
+    "facility_youth_total",
+    "lincoln_hills_count",
+    "ethan_allen_count",
+    "copper_lake_count",
+    "grow_academy_count",
+    "mendota_count",
+    "southern_oaks_count",
+)
+PERCENT_FIELDS = (
+    "inmate_total_percentage",
+    "male_maximum_security_percentage",
+    "male_medium_security_percentage",
+    "male_minimum_security_percentage",
+    "female_minimum_security_percentage",
+)
+ADULT_FIELDS = (
+    "probation_parole_total",
+    "inmate_total",
+    "male_maximum_security_count",
+    "male_medium_security_count",
+    "male_minimum_security_count",
+    "female_minimum_security_count",
+)
+
+# record of the inputs each figure was last rendered from
+FINGERPRINTS = os.path.join("fig", ".fingerprints.json")
 
 
 # -- plotting utilities -------------------------------------------------------
 
 def _unpack_data(data, fields):
-    times = [float(to_gps(t)) for t in data["publication_date"]]
+    from gwpy.timeseries import (TimeSeries, TimeSeriesDict)
+    times = to_gps_array(data.dates)
     return TimeSeriesDict({
         field: TimeSeries(data[field], times=times)
         for field in fields
     })
 
 
-def plot_incarcerated_youth(data):
+def _fingerprint(data, plot, fields):
+    """Hash the code a figure is rendered by and the data it would plot
+
+    That code includes all of this module (not just the plot function, as
+    figures also depend on `_unpack_data`) and `gpstime`.
+    """
+    import gpstime
+    digest = hashlib.sha256(plot.__name__.encode())
+    for module in (sys.modules[__name__], gpstime):
+        digest.update(inspect.getsource(module).encode())
+    digest.update(data.fingerprint(fields).encode())
+    return digest.hexdigest()
+
+
+def plot_incarcerated_youth(trends, output="fig/doc-youth-count.png"):
     """Parse input and plot trends for incarcerated youths"""
-    fields = [
-        "facility_youth_total",
-        "lincoln_hills_count",
-        "ethan_allen_count",
-        "copper_lake_count",
-        "grow_academy_count",
-        "mendota_count",
-        "southern_oaks_count",
-    ]
-    trends = _unpack_data(data, fields)
-    idx = data["ethan_allen_count"].index(0)
+    fields = YOUTH_FIELDS
+    idx = numpy.flatnonzero(trends[fields[2]].value == 0)[0]
     xticks = [str(n) for n in range(2008, 2023)]
+    (major, _) = calendar_ticks(2008, 2022)
 
     # plot raw counts
     plot = trends[fields[0]].plot(
@@ -69,31 +113,25 @@ def plot_incarcerated_youth(data):
         linewidth=1.25,
     )
     ax.set_xlabel("Calendar year")
-    ax.set_xlim([float(to_gps("2008-01-01")), float(to_gps("now"))])
-    ax.set_xticks([float(to_gps(f"{yr}-01-01")) for yr in xticks])
+    ax.set_xlim([gps("2008-01-01"), gps("now")])
+    ax.set_xticks(major)
     ax.set_xticklabels(xticks)
     ax.tick_params(axis="x", which="minor", bottom=False)
     ax.set_ylabel(r"Population size")
     ax.set_ylim([0, 650])
     ax.grid(color="#0d2240", alpha=0.4, linestyle="dotted")
     ax.legend(loc="upper right")
-    plot.savefig("fig/doc-youth-count.png", bbox_inches="tight", dpi=300)
+    plot.savefig(output, bbox_inches="tight", dpi=300)
     plot.close()
 
 
-def plot_incarcerated_total(data):
+def plot_incarcerated_total(trends, output="fig/doc-total-percent.png"):
     """Parse input and plot trends for the total number of incarcerated persons
     relative to the design capacity
     """
-    fields = [
-        "inmate_total_percentage",
-        "male_maximum_security_percentage",
-        "male_medium_security_percentage",
-        "male_minimum_security_percentage",
-        "female_minimum_security_percentage",
-    ]
-    trends = _unpack_data(data, fields)
+    fields = PERCENT_FIELDS
     xticks = [str(n) for n in range(2018, 2023)]
+    (major, minor) = calendar_ticks(2018, 2022)
 
     # plot percentage relative to design capacity
     plot = trends[fields[0]].plot(
@@ -130,7 +168,7 @@ def plot_incarcerated_total(data):
         linewidth=2,
     )
     ax.plot(
-        [float(to_gps("2019-01-07"))] * 2,
+        [gps("2019-01-07")] * 2,
         [100, 220],
         color="#0d2240",
         alpha=0.6,
@@ -138,7 +176,7 @@ def plot_incarcerated_total(data):
         linewidth=1,
     )
     ax.plot(
-        [float(to_gps("2020-03-25"))] * 2,
+        [gps("2020-03-25")] * 2,
         [100, 220],
         color="#0d2240",
         alpha=0.6,
@@ -146,46 +184,34 @@ def plot_incarcerated_total(data):
         linewidth=1,
     )
     ax.set_xlabel("Calendar year")
-    ax.set_xlim([float(to_gps("2018-01-01")), float(to_gps("now"))])
-    ax.set_xticks(
-        [float(to_gps(f"{yr}-{mo}-01"))
-         for yr in xticks for mo in range(2, 13)
-         if to_gps(f"{yr}-{mo}-01") < to_gps("now")],
-        minor=True,
-    )
-    ax.set_xticks([float(to_gps(f"{yr}-01-01")) for yr in xticks])
+    ax.set_xlim([gps("2018-01-01"), gps("now")])
+    ax.set_xticks(minor, minor=True)
+    ax.set_xticks(major)
     ax.set_xticklabels(xticks)
     ax.set_ylabel("Percentage of design capacity")
     ax.set_ylim([100, 220])
     ax.text(
-        float(to_gps("2019-01-14")),
+        gps("2019-01-14"),
         167,
         "Evers administration\nbegins",
     )
     ax.text(
-        float(to_gps("2020-03-18")),
+        gps("2020-03-18"),
         107,
         "COVID-19 lockdown\nbegins",
         ha="right",
     )
     ax.grid(color="#0d2240", alpha=0.4, linestyle="dotted")
     ax.legend(loc="upper right")
-    plot.savefig("fig/doc-total-percent.png", bbox_inches="tight", dpi=300)
+    plot.savefig(output, bbox_inches="tight", dpi=300)
     plot.close()
 
 
-def plot_incarcerated_adult(data):
+def plot_incarcerated_adult(trends, output="fig/doc-total-count.png"):
     """Parse input and plot trends for incarcerated adults"""
-    fields = [
-        "probation_parole_total",
-        "inmate_total",
-        "male_maximum_security_count",
-        "male_medium_security_count",
-        "male_minimum_security_count",
-        "female_minimum_security_count",
-    ]
-    trends = _unpack_data(data, fields)
+    fields = ADULT_FIELDS
     xticks = [str(n) for n in range(2018, 2023)]
+    (major, minor) = calendar_ticks(2018, 2022)
 
     # plot raw counts
     plot = (trends[fields[0]] / 1e3).plot(
@@ -225,7 +251,7 @@ def plot_incarcerated_adult(data):
         linewidth=2,
     )
     ax.plot(
-        [float(to_gps("2019-01-07"))] * 2,
+        [gps("2019-01-07")] * 2,
         [0, 70],
         color="#0d2240",
         alpha=0.6,
@@ -233,7 +259,7 @@ def plot_incarcerated_adult(data):
         linewidth=1,
     )
     ax.plot(
-        [float(to_gps("2020-03-25"))] * 2,
+        [gps("2020-03-25")] * 2,
         [0, 70],
         color="#0d2240",
         alpha=0.6,
@@ -241,42 +267,110 @@ def plot_incarcerated_adult(data):
         linewidth=1,
     )
     ax.set_xlabel("Calendar year")
-    ax.set_xlim([float(to_gps("2018-01-01")), float(to_gps("now"))])
-    ax.set_xticks(
-        [float(to_gps(f"{yr}-{mo}-01"))
-         for yr in xticks for mo in range(2, 13)
-         if to_gps(f"{yr}-{mo}-01") < to_gps("now")],
-        minor=True,
-    )
-    ax.set_xticks([float(to_gps(f"{yr}-01-01")) for yr in xticks])
+    ax.set_xlim([gps("2018-01-01"), gps("now")])
+    ax.set_xticks(minor, minor=True)
+    ax.set_xticks(major)
     ax.set_xticklabels(xticks)
     ax.set_ylabel(r"Population size ($\times$ 1000)")
     ax.set_ylim([0, 70])
-    ax.text(float(to_gps("2019-01-14")), 43, "Evers administration\nbegins")
-    ax.text(float(to_gps("2020-04-01")), 43, "COVID-19 lockdown\nbegins")
+    ax.text(gps("2019-01-14"), 43, "Evers administration\nbegins")
+    ax.text(gps("2020-04-01"), 43, "COVID-19 lockdown\nbegins")
     ax.grid(color="#0d2240", alpha=0.4, linestyle="dotted")
     ax.legend(loc="upper left", bbox_to_anchor=(0, 0.79))
-    plot.savefig("fig/doc-total-count.png", bbox_inches="tight", dpi=300)
+    plot.savefig(output, bbox_inches="tight", dpi=300)
     plot.close()
 
 
+# figures to render, with the function and columns for each
+FIGURES = {
+    "fig/doc-youth-count.png": (plot_incarcerated_youth, YOUTH_FIELDS),
+    "fig/doc-total-percent.png": (plot_incarcerated_total, PERCENT_FIELDS),
+    "fig/doc-total-count.png": (plot_incarcerated_adult, ADULT_FIELDS),
+}
+
+
+def render_figures(data, workers=None, force=False):
+    """Render every figure in `FIGURES` whose inputs changed since last time
+
+    The time series shared by all figures are built once, then stale figures
+    are rendered concurrently over a process pool of ``workers`` processes
+    (default: one per figure). Pass ``force=True`` to re-render everything.
+
+    Returns the list of figures that were rendered.
+    """
+    try:
+        with open(FINGERPRINTS, "r") as saved:
+            fingerprints = json.load(saved)
+    except FileNotFoundError:
+        fingerprints = {}
+    stale = {
+        output: _fingerprint(data, plot, fields)
+        for (output, (plot, fields)) in FIGURES.items()
+    }
+    stale = {
+        output: fingerprint for (output, fingerprint) in stale.items()
+        if force
+        or not os.path.exists(output)
+        or fingerprints.get(output) != fingerprint
+    }
+    if not stale:
+        return []
+
+    # build shared time series once, and send each figure only its columns
+    from gwpy.timeseries import TimeSeriesDict
+    trends = _unpack_data(data, dict.fromkeys(
+        field for output in stale for field in FIGURES[output][1]
+    ))
+    with ProcessPoolExecutor(max_workers=workers or len(stale)) as executor:
+        futures = [
+            executor.submit(
+                FIGURES[output][0],
+                TimeSeriesDict((field, trends[field])
+                               for field in FIGURES[output][1]),
+                output,
+            )
+            for output in stale
+        ]
+        for future in futures:
+            future.result()  # re-raise any errors
+
+    # only record fingerprints once rendering succeeded
+    fingerprints.update(stale)
+    with open(FINGERPRINTS, "w") as saved:
+        json.dump(fingerprints, saved, indent=2)
+    return list(stale)
+
+
 # -- main block ---------------------------------------------------------------
 
 if __name__ == "__main__":
-    # load from JSON
-    with open("doc-population-trends.json", "r") as datafile:
-        trends = json.load(datafile)
+    parser = argparse.ArgumentParser(
+        description="Plot DOC population trends and write them to CSV",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of processes used to render figures, "
+             "default: one per figure",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        default=False,
+        help="re-render all figures, even if their inputs have not changed",
+    )
+    args = parser.parse_args()
+
+    # load from binary data file
+    trends = PopulationData.read("doc-population-trends.npz")
 
     # prepare output destination
     os.makedirs("fig", exist_ok=True)
 
     # render population trends as timeseries figures
-    plot_incarcerated_youth(trends)
-    plot_incarcerated_total(trends)
-    plot_incarcerated_adult(trends)
+    render_figures(trends, workers=args.workers, force=args.force)
 
     # write data to CSV spreadsheet
-    with open("doc-population-trends.csv", "w") as output:
-        writer = csv.writer(output)
-        writer.writerow(trends.keys())
-        writer.writerows(zip(*[trends[key] for key in trends]))
+    trends.write("doc-population-trends.csv")
@@ -0,0 +1,136 @@
+"""Bulk extraction of victim cards from the Milwaukee Homicide Database
+
+Every card on the page is expanded by one injected script, and the text of
+all cards is read back by another, so the cost of a scrape no longer grows
+with one WebDriver round-trip per element.
+"""
+
+import re
+
+__all__ = [
+    "HEADER",
+    "expand_cards",
+    "parse_cards",
+    "read_cards",
+]
+
+# column headers of the output table
+HEADER = [
+    "Name",
+    "Age (years)",
+    "Date",
+    "Address",
+    "Charges filed?",
+    "Details",
+    "Media coverage",
+]
+
+# CSS classes used by the database app
+CLASSES = {
+    "card": "jss227",
+    "name": "jss234",
+    "expand": "jss235",
+    "date": "jss236",
+    "address": "jss237",
+}
+
+# click the expand button of every collapsed card: buttons may say whether
+# their card is open through aria-expanded; for any that do not, a card is
+# taken to be open if it shows any text, or if this script clicked it while
+# it held the same record (a re-rendered card may reuse an old button), so
+# running this again (e.g. on a retry) never toggles a card closed
+EXPAND_SCRIPT = """
+const classes = arguments[0];
+const text = (card, name) => Array.from(
+    card.getElementsByClassName(name), (item) => item.innerText).join("|");
+for (const card of document.getElementsByClassName(classes.card)) {
+    const expand = card.getElementsByClassName(classes.expand)[0];
+    const button = expand && expand.querySelector("button");
+    if (!button) {
+        continue;
+    }
+    const key = text(card, classes.name) + "|" + text(card, classes.date);
+    const expanded = button.getAttribute("aria-expanded");
+    if (expanded === "true") {
+        continue;
+    }
+    if (expanded === null && (
+            button.dataset.scraperExpanded === key ||
+            Array.from(card.getElementsByTagName("p")).some(
+                (item) => item.innerText.trim()))) {
+        continue;
+    }
+    button.dataset.scraperExpanded = key;
+    button.click();
+}
+"""
+
+# read the text of every field, and the paragraphs and links of each card
+READ_SCRIPT = """
+const classes = arguments[0];
+const text = (name) => Array.from(
+    document.getElementsByClassName(name), (item) => item.innerText);
+const cards = Array.from(document.getElementsByClassName(classes.card));
+return {
+    name: text(classes.name),
+    date: text(classes.date),
+    address: text(classes.address),
+    details: cards.map((card) => Array.from(
+        card.getElementsByTagName("p"), (item) => item.innerText)),
+    coverage: cards.map((card) => Array.from(
+        card.getElementsByTagName("a"), (item) => item.href)),
+};
+"""
+
+
+def expand_cards(browser):
+    """Click open every collapsed card on the page at once"""
+    browser.execute_script(EXPAND_SCRIPT, CLASSES)
+
+
+def read_cards(browser, complete=True, previous=None):
+    """Read the fields of every card on the page at once
+
+    If ``complete`` is `True`, this returns `None` until there are cards on
+    the page and each one shows some text (at least one paragraph that is
+    not empty), and if ``previous`` is given, until the cards (going by
+    name and date) differ from those in it, e.g. from the last year read.
+    Either way, it can be used as a wait condition.
+    """
+    data = browser.execute_script(READ_SCRIPT, CLASSES)
+    if previous is not None and (
+        (data["name"], data["date"]) ==
+        (previous["name"], previous["date"])
+    ):
+        return None
+    if complete and not (
+        data["details"] and
+        all(any(pars) for pars in data["details"])
+    ):
+        return None
+    return data
+
+
+def _extract_age(text):
+    try:
+        age_str = re.search("[0-9]+ years", text)[0]
+        return int(age_str.split(" ")[0])
+    except TypeError:
+        return ""
+
+
+def parse_cards(data):
+    """Parse card fields, as returned by `read_cards`, into table rows
+
+    Each row has one entry per column in `HEADER`.
+    """
+    details = ["\n".join(pars) for pars in data["details"]]
+    age = [_extract_age(text) for text in details]
+    charges = ["Yes" if ("Charges" in text) else "No"
+               for text in details]
+    coverage = ["\n".join(links) for links in data["coverage"]]
+    return list(map(
+        list,
+        zip(data["name"], age, data["date"], data["address"],
+            charges, details, coverage),
+    ))
@@ -0,0 +1,224 @@
+"""Compare City of Milwaukee salary records across years"""
+
+import csv
+
+import numpy
+
+__all__ = [
+    "build_panel",
+    "load_panel",
+    "outer_join",
+    "save_panel",
+]
+
+
+def _make_unique(ls):
+    """Pair each string in a list with a running count of its previous
+    occurrences, so that repeated strings become unique keys
+    """
+    seen = {}
+    keys = []
+    for s in ls:
+        count = seen.get(s, 0)
+        keys.append((s, count))
+        seen[s] = count + 1
+    return keys
+
+
+def _read_tsv(path):
+    """Stream a TSV file with a header row into a dict of column lists"""
+    with open(path, "r") as fileobj:
+        reader = csv.reader(fileobj, delimiter="\t")
+        header = next(reader)
+        columns = [[] for _ in header]
+        for row in reader:
+            for (column, value) in zip(columns, row):
+                column.append(value)
+    return dict(zip(header, columns))
+
+
+def _is_dollar_column(values):
+    """Check whether every non-empty entry of a column is a dollar amount"""
+    values = numpy.char.strip(numpy.asarray(values, dtype=str))
+    values = values[values != ""]
+    return bool(values.size) and bool(numpy.char.startswith(values, "$").all())
+
+
+def _parse_dollars(values):
+    """Parse a whole column of dollar amounts into floats at once, with
+    empty entries as NaN
+    """
+    values = numpy.char.strip(numpy.asarray(values, dtype=str))
+    values = numpy.char.replace(numpy.char.replace(values, "$", ""), ",", "")
+    values[values == ""] = "nan"
+    return values.astype(float)
+
+
+def outer_join(datasets, shared=3, values=None):
+    """Perform an outer join on yearly datasets along their first column
+
+    Parameters
+    ----------
+    datasets : `dict`
+        datasets keyed by year, in chronological order, each mapping column
+        names to lists of entries
+
+    shared : `int`, optional
+        number of leading columns (starting with the key) common to every
+        year, taken from the latest year each entry appears in, default: 3
+
+    values : `dict`, optional
+        number of year-specific columns that follow the shared ones, keyed
+        by year, default: all remaining columns
+
+    Returns
+    -------
+    joined : `list` of `list`
+        a header row, followed by one row per entry
+
+    Notes
+    -----
+    Entries with the same key (e.g. two employees with the same name) are
+    matched in the order they appear within each year. Any columns of the
+    latest dataset beyond its year-specific ones are carried over as-is.
+
+    Rows are grouped by the latest year each entry appears in, then kept in
+    that year's order, so entries that disappeared come first.
+    """
+    values = values or {}
+    years = list(datasets)
+    last = years[-1]
+    columns = {year: list(ds.keys()) for (year, ds) in datasets.items()}
+    key = columns[last][0]  # match along the first key
+    assert all(cols[0] == key for cols in columns.values())  # consistency
+    spans = {
+        year: cols[shared:shared + values.get(year, len(cols) - shared)]
+        for (year, cols) in columns.items()
+    }
+    extras = columns[last][shared + len(spans[last]):]
+
+    # index rows of each dataset by unique key, and find the latest
+    # year in which each key appears
+    index = {
+        year: {k: i for (i, k) in enumerate(_make_unique(ds[key]))}
+        for (year, ds) in datasets.items()
+    }
+    latest = {}
+    for year in years:
+        latest.update(dict.fromkeys(index[year], year))
+
+    # join datasets along rows
+    joined = []
+    for year in years:
+        ds = datasets[year]
+        for (k, i) in index[year].items():
+            if latest[k] != year:
+                continue
+            row = [ds[col][i] for col in columns[year][:shared]]
+            for other in years:
+                j = index[other].get(k)
+                row += [
+                    "" if j is None else datasets[other][col][j]
+                    for col in spans[other]
+                ]
+            row += [
+                ds[col][i] if year == last else ""
+                for col in extras
+            ]
+            joined.append(row)
+
+    # prepare new column headers
+    header = (
+        columns[last][:shared] +
+        [f"{year} {col}" for year in years for col in spans[year]] +
+        extras
+    )
+    return [header] + joined
+
+
+def build_panel(files, shared=3):
+    """Build one wide employee-by-year table from yearly salary files
+
+    Parameters
+    ----------
+    files : `dict`
+        paths to tab-separated salary files, keyed by year
+
+    shared : `int`, optional
+        number of leading columns (starting with the name) that identify
+        each employee, taken from the latest year they appear in, default: 3
+
+    Returns
+    -------
+    panel : `dict` of `numpy.ndarray`
+        identifying columns as string arrays, then every dollar column as a
+        float array named ``"<year> <column>"`` (NaN where an employee is
+        absent that year), then the change in each dollar column between
+        consecutive years, named ``"<column> change <year>-<year>"``
+
+    Notes
+    -----
+    Dollar columns are those whose non-empty entries all start with ``$``.
+    As with `outer_join`, employees sharing a name are matched in the order
+    they appear within each year.
+    """
+    years = sorted(files)
+    data = {year: _read_tsv(files[year]) for year in years}
+
+    # assign each employee a row, in order of first appearance
+    keys = {
+        year: _make_unique(ds[next(iter(ds))])
+        for (year, ds) in data.items()
+    }
+    rows = {}
+    for year in years:
+        rows.update(dict.fromkeys(k for k in keys[year] if k not in rows))
+    rows = {k: i for (i, k) in enumerate(rows)}
+
+    # identifying columns, with later years taking precedence
+    panel = {}
+    for year in years:
+        idx = numpy.array([rows[k] for k in keys[year]], dtype=int)
+        for col in list(data[year])[:shared]:
+            column = panel.setdefault(
+                col,
+                numpy.full(len(rows), "", dtype=object),
+            )
+            column[idx] = data[year][col]
+    panel = {col: column.astype(str) for (col, column) in panel.items()}
+
+    # dollar columns, parsed in bulk
+    dollars = {}
+    for year in years:
+        idx = numpy.array([rows[k] for k in keys[year]], dtype=int)
+        dollars[year] = [
+            col for col in list(data[year])[shared:]
+            if _is_dollar_column(data[year][col])
+        ]
+        for col in dollars[year]:
+            column = numpy.full(len(rows), numpy.nan)
+            column[idx] = _parse_dollars(data[year][col])
+            panel[f"{year} {col}"] = column
+
+    # year-over-year changes
+    for (before, after) in zip(years, years[1:]):
+        for col in dollars[after]:
+            if col in dollars[before]:
+                panel[f"{col} change {before}-{after}"] = (
+                    panel[f"{after} {col}"] - panel[f"{before} {col}"]
+                )
+    return panel
+
+
+def save_panel(panel, path):
+    """Write a salary panel to a binary ``.npz`` file, one array per column"""
+    numpy.savez(path, **panel)
+
+
+def load_panel(path, columns=None):
+    """Read a salary panel, or only some of its columns, from a ``.npz`` file
+
+    Columns are stored separately, so only those requested are read.
+    """
+    with numpy.load(path) as panel:
+        return {col: panel[col] for col in (columns or panel.files)}
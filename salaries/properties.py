@@ -0,0 +1,233 @@
+"""Cross-reference salary records with City of Milwaukee property records
+
+Owner searches on the City assessment site are run concurrently over a pool
+of headless Chrome sessions, one per worker thread. Each distinct owner is
+only searched once, and results are kept in an on-disk cache, so repeated
+names cost nothing and interrupted runs pick up where they left off.
+"""
+
+import json
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+
+from scraping import (
+    RetryPolicy,
+    TRANSIENT_ERRORS,
+)
+
+__all__ = ["lookup_properties"]
+
+SOURCE = "https://assessments.milwaukee.gov/SearchResults.asp?SearchOwner"
+
+# default location of the search cache, one JSON object per line
+CACHE_FILE = "property-search-cache.jsonl"
+
+# text shown when a search has no results
+NO_RESULTS = "No matching records found"
+
+# retries and waits for page loads, shared by all workers
+RETRY = RetryPolicy()
+
+
+def _results_loaded(browser):
+    """Return whether a search has finished loading, with or without results
+    """
+    return (
+        bool(browser.find_elements_by_xpath("//table[@id='T1']")) or
+        NO_RESULTS in browser.find_element_by_tag_name("body").text
+    )
+
+
+@RETRY
+def _get_mke_properties(browser):
+    def parse_column(tbody, col):
+        if col in [3, 5, 6, 7, 8]:
+            # handle columns bafflingly packed with two entries
+            packed = [row[col].text.split("\n")
+                      for row in tbody]
+            return ["\n".join(item) for item in
+                    map(list, zip(*packed))]
+        return "\n".join([row[col].text for row in tbody])
+
+    if NO_RESULTS in browser.find_element_by_tag_name("body").text:
+        return list()
+    # first, locate the table
+    table = browser.find_element_by_xpath("//table[@id='T1']")
+    # next, locate rows in the body of the table
+    tbody = [item.find_elements_by_tag_name("td")
+             for item in table.find_elements_by_tag_name("tr")[1::]]
+    # capture property values separately
+    values = parse_column(tbody, 4).replace("$", "").replace(",", "")
+    total = sum([float(val) for val in values.splitlines()])
+    return [  # finally, parse these entries into CSV-friendly text
+        len(values.splitlines()),  # no. of properties
+        parse_column(tbody, 0),  # taxkey
+        parse_column(tbody, 1),  # address
+        values,  # assessed value
+        total,  # total property value
+    ] + (
+        parse_column(tbody, 3) +  # build year, type
+        parse_column(tbody, 5) +  # beds, baths
+        parse_column(tbody, 6) +  # lot size, area (sq. ft.)
+        parse_column(tbody, 7) +  # LUC, description
+        parse_column(tbody, 8)  # sale date, sale price
+    )
+
+
+def _normalize_name(name):
+    """Normalize case and spacing in a "Last, First" name, so that the
+    same person is always searched (and cached) under the same key
+    """
+    return ",".join(" ".join(part.split()) for part in name.upper().split(","))
+
+
+def _format_query(name):
+    """Turn a "Last, First" name into an owner search query"""
+    return "+".join(name.split(",")[::-1]).replace(" ", "+")
+
+
+class SearchCache(object):
+    """Persistent record of completed owner searches
+
+    Both hits and empty results are stored; failed searches are not, so they
+    are tried again next time. Each result is appended and flushed to disk as
+    soon as it arrives, so nothing is lost if a run is interrupted.
+
+    Parameters
+    ----------
+    path : `str`
+        path of the cache file, created if it does not exist
+    """
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as cachefile:
+                for line in cachefile:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:  # partial line from an interruption
+                        continue
+                    self.results[entry["name"]] = entry["properties"]
+
+    def __contains__(self, name):
+        return name in self.results
+
+    def get(self, name):
+        return self.results.get(name)
+
+    def add(self, name, properties):
+        """Store the result of a search, if it succeeded"""
+        if properties is None:
+            return
+        with self._lock:
+            self.results[name] = properties
+            with open(self.path, "a") as cachefile:
+                cachefile.write(json.dumps({
+                    "name": name,
+                    "properties": properties,
+                }) + "\n")
+
+
+class BrowserPool(object):
+    """Hand each worker thread its own browser session, and close them all
+    when done
+
+    Parameters
+    ----------
+    options : `selenium.webdriver.ChromeOptions`, optional
+        options for each Chrome session, default: headless
+    """
+    def __init__(self, options=None):
+        if options is None:
+            options = webdriver.ChromeOptions()
+            options.add_argument("--headless")
+        self.options = options
+        self.browsers = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the browser for the current thread, starting it if needed"""
+        if not hasattr(self._local, "browser"):
+            self._local.browser = webdriver.Chrome(options=self.options)
+            with self._lock:
+                self.browsers.append(self._local.browser)
+        return self._local.browser
+
+    def close(self):
+        for browser in self.browsers:
+            browser.quit()
+        self.browsers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def search_owner(browser, name):
+    """Search for properties owned by a person, using the given browser
+
+    Returns a list of fields describing their properties (empty if they
+    own none), or `None` if the search failed.
+    """
+    browser.get(f"{SOURCE}={_format_query(name)}")
+    try:
+        RETRY.wait(browser, _results_loaded)
+        return _get_mke_properties(browser)
+    except (TimeoutException,) + TRANSIENT_ERRORS:
+        return None
+
+
+def lookup_properties(names, options=None, workers=4, cache=CACHE_FILE):
+    """Look up properties owned by each of a list of people
+
+    Names are normalized and de-duplicated, and only those missing from the
+    cache at ``cache`` are searched, concurrently over ``workers`` browser
+    sessions. Results are yielded in the same order as ``names``, each as
+    returned by `search_owner`. Blank names are skipped and yield `None`.
+
+    Searches only run a few names (twice ``workers``) ahead of the results
+    consumed so far, and any not yet started are cancelled if the consumer
+    stops early (e.g. on `KeyboardInterrupt`).
+    """
+    cache = SearchCache(cache)
+    keys = [_normalize_name(name) for name in names]
+    pending = [key for key in dict.fromkeys(keys) if key and key not in cache]
+    if not pending:
+        yield from map(cache.get, keys)
+        return
+    order = {key: i for (i, key) in enumerate(pending)}
+    window = 2 * workers
+
+    with BrowserPool(options) as pool, ThreadPoolExecutor(
+        max_workers=workers,
+    ) as executor:
+        def search(key):
+            properties = search_owner(pool.get(), key)
+            cache.add(key, properties)
+            return properties
+
+        # searches are submitted in order, so len(futures) is the position
+        # in `pending` of the next one to submit
+        futures = {}
+        try:
+            for key in keys:
+                if key not in order:
+                    yield cache.get(key)
+                    continue
+                for ahead in pending[len(futures):order[key] + window]:
+                    futures[ahead] = executor.submit(search, ahead)
+                yield futures[key].result()
+        except BaseException:  # including GeneratorExit
+            for future in futures.values():
+                future.cancel()  # only succeeds if not yet started
+            raise
@@ -0,0 +1,58 @@
+"""Parse salary tables out of saved or live Caspio data pages
+
+Each page of the salary database is parsed from its HTML source in one go,
+rather than reading every cell through a separate WebDriver call.
+"""
+
+import lxml.html
+
+__all__ = ["parse_table"]
+
+
+# stand-in for line breaks, while whitespace from the source is collapsed
+_BREAK = "\ue000"
+
+
+def _text(element):
+    """Return the text of an element as a browser would render it, with
+    line breaks only at each ``<br>``
+    """
+    for br in element.iter("br"):
+        br.tail = _BREAK + (br.tail or "")
+    return "\n".join(
+        " ".join(line.split())
+        for line in element.text_content().split(_BREAK)
+        if line.strip()
+    )
+
+
+def parse_table(html):
+    """Parse column headers and rows of data from an HTML page
+
+    Only the table holding the column headers is read (the whole page, if
+    there are none), so rows from other tables on the page, e.g. the page
+    navigation, are not mistaken for data.
+
+    Parameters
+    ----------
+    html : `str`
+        HTML source of one page of the salary database, e.g. the
+        ``page_source`` of a browser, or a saved copy of it
+
+    Returns
+    -------
+    header : `list` of `str`
+        text of every header cell in the table
+
+    rows : `list` of `list` of `str`
+        text of the data cells in every table row that has any
+    """
+    tree = lxml.html.fromstring(html)
+    first = next(tree.iter("th"), None)
+    table = tree if first is None else next(first.iterancestors("table"), tree)
+    header = [_text(th) for th in table.iter("th")]
+    rows = [
+        [_text(td) for td in tr.iter("td")]
+        for tr in table.iter("tr")
+    ]
+    return (header, [row for row in rows if row])
@@ -0,0 +1,56 @@
+"""Check `tables.parse_table` against a saved data page
+
+Run from the ``salaries`` directory with ``python -m pytest``.
+"""
+
+import os
+
+from tables import parse_table
+
+# saved copy of one data page, with made-up records
+FIXTURE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "fixtures",
+    "salaries-page.html",
+)
+
+HEADER = ["Name", "Job title", "Department", "Base\nsalary", "Overtime"]
+
+ROWS = [
+    [
+        "Doe, Jane A",
+        "Police Officer",
+        "Police Department",
+        "$68,000.00",
+        "$12,345.67",
+    ],
+    [
+        "Roe, Richard",
+        "Electrical Mechanic\n(Lead)",
+        "Dept. of Public Works & Infrastructure",
+        "$72,510.40",
+        "",
+    ],
+    [
+        "Smith, Pat",
+        "Librarian II",
+        "Library",
+        "$55,012.00",
+        "$0.00",
+    ],
+]
+
+
+def test_parse_table():
+    with open(FIXTURE, "r") as page:
+        (header, rows) = parse_table(page.read())
+    assert header == HEADER
+    assert rows == ROWS
+
+
+def test_parse_table_without_header():
+    (header, rows) = parse_table(
+        "<table><tr><td>a<br>b</td><td> c  d </td></tr></table>",
+    )
+    assert header == []
+    assert rows == [["a\nb", "c d"]]
@@ -0,0 +1,283 @@
+"""Shared helpers for the browser-based scrapers
+
+Notebooks in this repository can import these after adding the top-level
+directory to their path, e.g.
+
+    import os
+    import sys
+    sys.path.insert(0, os.pardir)
+
+    from scraping import RetryPolicy
+"""
+
+import csv
+import functools
+import json
+import os
+import threading
+import time
+
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+)
+from selenium.webdriver.support.ui import WebDriverWait
+
+__all__ = ["CheckpointedWriter", "RetryPolicy", "TRANSIENT_ERRORS"]
+
+# errors raised while a page is still loading or re-rendering
+TRANSIENT_ERRORS = (
+    NoSuchElementException,
+    StaleElementReferenceException,
+)
+
+
+# -- retry policy -------------------------------------------------------------
+
+class RetryStats(object):
+    """Running counts of calls, retries, and time spent waiting
+
+    Counts are updated under a lock, so one set of stats can be shared by
+    several worker threads.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.waited = 0.
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for (key, value) in counts.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "waited": self.waited,
+        }
+
+    def __repr__(self):
+        return (
+            f"{self.calls} calls, {self.retries} retries, "
+            f"{self.failures} failures, {self.timeouts} timeouts, "
+            f"{self.waited:.1f} seconds waited"
+        )
+
+
+class RetryPolicy(object):
+    """Bounded retries with exponential backoff, and explicit waits
+
+    Instances can decorate functions that touch the page, which are retried
+    on transient errors, sleeping ``delay`` seconds before the first retry
+    and ``backoff`` times longer before each one after (up to ``max_delay``),
+    until ``attempts`` calls have been made, after which the last error is
+    raised.
+
+    Parameters
+    ----------
+    attempts : `int`, optional
+        maximum number of calls, including the first, default: 5
+
+    delay : `float`, optional
+        initial delay between calls, in seconds, default: 0.5
+
+    backoff : `float`, optional
+        factor by which to grow the delay after each retry, default: 2
+
+    max_delay : `float`, optional
+        longest delay between calls, in seconds, default: 10
+
+    timeout : `float`, optional
+        longest time `wait` will wait for a condition, in seconds,
+        default: 10
+
+    errors : `tuple` of `type`, optional
+        exceptions to retry on, default: `TRANSIENT_ERRORS`
+    """
+    def __init__(self, attempts=5, delay=0.5, backoff=2, max_delay=10,
+                 timeout=10, errors=TRANSIENT_ERRORS):
+        self.attempts = attempts
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.errors = errors
+        self.stats = RetryStats()
+
+    def __call__(self, f):
+        @functools.wraps(f)
+        def wrapped(*args, **kwargs):
+            return self.call(f, *args, **kwargs)
+        return wrapped
+
+    def call(self, f, *args, **kwargs):
+        """Call a function, retrying on transient errors"""
+        delay = self.delay
+        for attempt in range(1, self.attempts + 1):
+            self.stats.add(calls=1)
+            try:
+                return f(*args, **kwargs)
+            except self.errors:
+                if attempt == self.attempts:
+                    self.stats.add(failures=1)
+                    raise
+            self.stats.add(retries=1, waited=delay)
+            time.sleep(delay)
+            delay = min(delay * self.backoff, self.max_delay)
+
+    def wait(self, driver, condition, timeout=None):
+        """Wait until a condition holds, and return its value
+
+        Parameters
+        ----------
+        driver : `selenium.webdriver.remote.webdriver.WebDriver`
+            the browser to poll, or any element within it
+
+        condition : `callable`
+            called with ``driver`` until it returns something truthy, e.g.
+            one of `selenium.webdriver.support.expected_conditions`
+
+        timeout : `float`, optional
+            longest time to wait, in seconds, default: ``self.timeout``
+
+        Raises
+        ------
+        selenium.common.exceptions.TimeoutException
+            if the condition does not hold in time
+        """
+        start = time.time()
+        try:
+            return WebDriverWait(
+                driver,
+                self.timeout if timeout is None else timeout,
+                poll_frequency=self.delay,
+                ignored_exceptions=self.errors,
+            ).until(condition)
+        except TimeoutException:
+            self.stats.add(timeouts=1)
+            raise
+        finally:
+            self.stats.add(waited=time.time() - start)
+
+
+# -- streaming output ---------------------------------------------------------
+
+class CheckpointedWriter(object):
+    """Append rows to a delimited text file as they are scraped
+
+    Each batch of rows is flushed to disk along with a checkpoint, kept
+    next to the output as ``<path>.checkpoint``, which records the position
+    (e.g. page number or row index) of the last batch written and the size
+    of the file at that point. Reopening the same path resumes from there:
+    anything written after the last checkpoint is discarded, so rows are
+    never duplicated, and `position` tells the scraper where to carry on.
+    Anything else the scraper needs to resume (e.g. rows to retry) can be
+    kept in `meta`, which is saved with each checkpoint.
+
+    Parameters
+    ----------
+    path : `str`
+        path of the output file
+
+    header : `list` of `str`
+        column headers, written when the file is started
+
+    delimiter : `str`, optional
+        column delimiter, default: ``","``
+
+    restart : `bool`, optional
+        if `True`, ignore any checkpoint and start the file over,
+        default: `False`
+    """
+    def __init__(self, path, header, delimiter=",", restart=False):
+        self.path = path
+        self.checkpoint = f"{path}.checkpoint"
+        state = None if restart else self._load_checkpoint()
+        if state is None:
+            state = {
+                "position": None,
+                "rows": 0,
+                "complete": False,
+                "meta": {},
+            }
+            self._file = open(path, "w", newline="")
+            self._writer = csv.writer(self._file, delimiter=delimiter)
+            self._writer.writerow(header)
+            self._save(state)
+        else:
+            self._file = open(path, "r+", newline="")
+            self._file.truncate(state["offset"])
+            self._file.seek(state["offset"])
+            self._writer = csv.writer(self._file, delimiter=delimiter)
+        self.state = state
+
+    @property
+    def position(self):
+        """Position of the last batch written, or `None` if none were"""
+        return self.state["position"]
+
+    @property
+    def rows(self):
+        """Number of rows written so far, not counting the header"""
+        return self.state["rows"]
+
+    @property
+    def complete(self):
+        """Whether `finish` has been called for this file"""
+        return self.state["complete"]
+
+    @property
+    def meta(self):
+        """Extra JSON-serializable values, saved with each checkpoint"""
+        return self.state.setdefault("meta", {})
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint, "r") as checkpoint:
+                state = json.load(checkpoint)
+        except (FileNotFoundError, ValueError):
+            return None
+        if (
+            not os.path.exists(self.path) or
+            os.path.getsize(self.path) < state["offset"]
+        ):  # output has gone missing since
+            return None
+        return state
+
+    def _save(self, state):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        state["offset"] = self._file.tell()
+        # write then rename, so an interruption never leaves a partial file
+        with open(f"{self.checkpoint}.tmp", "w") as checkpoint:
+            json.dump(state, checkpoint)
+        os.replace(f"{self.checkpoint}.tmp", self.checkpoint)
+
+    def write(self, rows, position):
+        """Write a batch of rows, and record its position"""
+        rows = list(rows)
+        self._writer.writerows(rows)
+        self.state["position"] = position
+        self.state["rows"] += len(rows)
+        self._save(self.state)
+
+    def finish(self):
+        """Mark the output as complete, so later runs skip it"""
+        self.state["complete"] = True
+        self._save(self.state)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()